@@ -607,32 +607,107 @@ def simulate_ai_response(question: str) -> str:
     return random.choice(default_responses)
 
 # LMU Buddy Integration with your Llama model
-def call_lmu_buddy_api(question: str) -> str:
+@st.cache_resource(show_spinner=False)
+def get_rag_system():
     """
-    Use your fine-tuned Llama model directly for LMU Buddy responses.
+    Shared RAG system (LMU knowledge retrieval and the semantic answer cache), or None if unavailable.
     """
     try:
-        # Import the LLM handler
-        from src.llm_handler import LLMHandler
-        
-        # Initialize the LLM handler
-        llm_handler = LLMHandler()
-        
-        # Generate response using your Llama model
-        response = llm_handler.generate_response(question)
+        from src.rag_system import RAGSystem
+        return RAGSystem()
+    except Exception:
+        return None
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_llm_handler(fingerprint: tuple):
+    """
+    Shared LLM handler for one version of config.json and personality_config.
+    """
+    from src.llm_handler import get_llm_handler
+    return get_llm_handler()
+
+def get_llm_handler():
+    """
+    Shared LLM handler, rebuilt only when config.json or personality_config changes.
+    """
+    from src.llm_handler import handler_fingerprint
+    return load_llm_handler(handler_fingerprint())
+
+TRUNCATED_REPLY_NOTICE = "\n\n⚠️ ngl my answer got cut off there, try asking again in a sec!"
+
+def stream_lmu_buddy_api(question: str, metrics: Dict):
+    """
+    Stream the LMU Buddy reply token by token, filling metrics with time-to-first-token and tokens/sec.
+    """
+    start = time.perf_counter()
+    metrics.update({"source": "llm", "ttft_ms": None, "tokens": 0, "tokens_per_second": None, "truncated": False})
+    tokens = []
+    try:
+        # Paraphrases of recently answered questions skip generation entirely
+        rag = get_rag_system()
+        context = ""
+        generation = None
+        if rag is not None:
+            cached_answer = rag.lookup_answer(question)
+            if cached_answer:
+                metrics.update({"source": "answer_cache", "ttft_ms": 1000 * (time.perf_counter() - start)})
+                yield cached_answer
+                return
+            generation = rag.generation
+            context = rag.get_relevant_context(question)
         
-        # If the response indicates an error, fallback to mock response
-        if response.startswith("🚨") or "error" in response.lower():
-            return simulate_lmu_buddy_response(question)
+        first_token_at = None
+        failure = None
+        for token in get_llm_handler().generate_streaming_response(question, context):
+            # Failures arrive as a single message instead of tokens
+            if token.startswith(("🚨", "API Error:", "Error:")):
+                failure = token
+                break
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                metrics["ttft_ms"] = 1000 * (first_token_at - start)
+            tokens.append(token)
+            yield token
         
-        return response
+        # Ollama streams one token per chunk
+        metrics["tokens"] = len(tokens)
+        if len(tokens) > 1:
+            metrics["tokens_per_second"] = (len(tokens) - 1) / max(time.perf_counter() - first_token_at, 1e-6)
+        if tokens and failure is None:
+            if rag is not None:
+                rag.store_answer(question, "".join(tokens), generation)
+            return
+        if tokens:
+            st.error(f"LLM Error: {failure}")
         
     except ImportError:
-        # Fallback if LLM handler is not available
-        return simulate_lmu_buddy_response(question)
+        pass
     except Exception as e:
         st.error(f"LLM Error: {str(e)}")
-        return simulate_lmu_buddy_response(question)
+    
+    if tokens:
+        # Cut off mid-answer: say so rather than pass the partial reply off as complete
+        metrics["truncated"] = True
+        yield TRUNCATED_REPLY_NOTICE
+        return
+    
+    # Nothing was streamed: answer from the offline responder instead
+    metrics.update({"source": "fallback", "ttft_ms": 1000 * (time.perf_counter() - start)})
+    yield simulate_lmu_buddy_response(question)
+
+def write_stream(stream) -> str:
+    """
+    Render a token stream incrementally and return the full text (st.write_stream needs Streamlit 1.31+).
+    """
+    if hasattr(st, "write_stream"):
+        return st.write_stream(stream)
+    placeholder = st.empty()
+    text = ""
+    for token in stream:
+        text += token
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    return text
 
 def simulate_lmu_buddy_response(question: str) -> str:
     """
@@ -1879,15 +1954,20 @@ def show_ai_assistant():
     # Handle sending message
     if ask_button and question:
         try:
-            # Generate response using LMU Buddy API
-            response = call_lmu_buddy_api(question)
+            # Stream the reply as it is generated instead of waiting for the whole answer
+            st.write(f"**You:** {question}")
+            st.write("**Assistant:**")
+            metrics = {}
+            response = write_stream(stream_lmu_buddy_api(question, metrics))
             
             # Add to conversation history
             st.session_state.conversation_history.append({
                 "question": question,
                 "answer": response,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "metrics": metrics
             })
+            st.session_state.setdefault("reply_metrics", []).append(metrics)
             
             # Award points for asking questions
             if st.session_state.user_id:
@@ -1906,6 +1986,13 @@ def show_ai_assistant():
         st.write("Question:", question)
         st.write("Ask button clicked:", ask_button)
         st.write("Conversation history length:", len(st.session_state.conversation_history))
+        
+        # Perceived latency of streamed LLM replies (cache hits and fallbacks excluded)
+        streamed = [m for m in st.session_state.get("reply_metrics", []) if m.get("source") == "llm" and m.get("ttft_ms") is not None]
+        if streamed:
+            st.write("Last reply:", f"{streamed[-1]['ttft_ms']:.0f} ms to first token,",
+                     f"{streamed[-1]['tokens_per_second'] or 0:.1f} tokens/sec")
+            st.write("Median time to first token (ms):", float(np.median([m["ttft_ms"] for m in streamed])))
         st.write("Session state keys:", list(st.session_state.keys()))
         
         # Test button
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark embedding backends: encode latency on short queries, throughput on long
+chunks, and parity against the PyTorch sentence-transformers embeddings
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import numpy as np
+from src.embeddings import OnnxEmbeddingModel, compare_embeddings, load_embedding_model
+
+SHORT_QUERIES = [
+    "Where can I study?",
+    "library hours",
+    "What's happening on campus this week?",
+    "How do I join Greek life?",
+    "Where can I find a math tutor?",
+    "What's the GPA requirement for study abroad?",
+    "How do I file an academic grievance?",
+    "is the lair open rn"
+]
+
+def load_long_chunks(target_chars: int = 1000, limit: int = 128) -> list:
+    """Build long chunks (~MiniLM window sized) out of the bundled knowledge files"""
+    texts = []
+    knowledge_file = "data/lmu_knowledge/all_data.json"
+    if os.path.exists(knowledge_file):
+        with open(knowledge_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for items in data.values():
+            for item in items:
+                if isinstance(item, dict):
+                    texts.append(item.get("content") or item.get("description") or "")
+    corpus = " ".join(text for text in texts if text) or " ".join(SHORT_QUERIES)
+
+    chunks = []
+    while len(chunks) < limit:
+        for start in range(0, len(corpus), target_chars):
+            chunks.append(corpus[start:start + target_chars])
+            if len(chunks) >= limit:
+                break
+    return chunks
+
+def benchmark_backend(name: str, model, queries: list, chunks: list, repeats: int, batch_size: int) -> dict:
+    """Measure single-query latency and bulk chunk throughput"""
+    model.encode(queries[:1])  # Warm up lazy initialisation
+
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            model.encode([query])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    chunk_embeddings = np.asarray(model.encode(chunks, batch_size=batch_size), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "backend": name,
+        "query_p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "query_p95_ms": 1000 * float(np.percentile(latencies, 95)),
+        "chunks_per_second": len(chunks) / elapsed,
+        "query_embeddings": np.asarray(model.encode(queries), dtype=np.float32),
+        "chunk_embeddings": chunk_embeddings
+    }
+
+def main():
+    """Run the benchmark"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark RAG embedding backends")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Embedding model name")
+    parser.add_argument("--repeats", type=int, default=5, help="Passes over the short queries")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size for long chunks")
+    parser.add_argument("--chunks", type=int, default=128, help="Number of long chunks to encode")
+    parser.add_argument("--cache-dir", default="data/models", help="Where ONNX exports are cached")
+
+    args = parser.parse_args()
+
+    chunks = load_long_chunks(limit=args.chunks)
+    print(f"⏱️ Benchmarking {args.model}: {len(SHORT_QUERIES)} short queries x {args.repeats}, "
+          f"{len(chunks)} long chunks (batch {args.batch_size})")
+
+    backends = [("pytorch-fp32", lambda: load_embedding_model(args.model))]
+    for quantize, label in ((False, "onnx-fp32"), (True, "onnx-int8")):
+        backends.append((label, lambda quantize=quantize: OnnxEmbeddingModel(
+            args.model, cache_dir=args.cache_dir, quantize=quantize
+        )))
+
+    results = []
+    for name, loader in backends:
+        try:
+            start = time.perf_counter()
+            model = loader()
+            load_seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"   ⚠️ {name}: unavailable ({e})")
+            continue
+        result = benchmark_backend(name, model, SHORT_QUERIES, chunks, args.repeats, args.batch_size)
+        result["load_seconds"] = load_seconds
+        results.append(result)
+
+    if not results:
+        print("❌ No embedding backend could be loaded")
+        return False
+
+    reference = results[0]
+    print(f"\n{'backend':<14}{'load s':>8}{'q p50 ms':>10}{'q p95 ms':>10}{'chunks/s':>10}{'min cos':>10}{'mean cos':>10}")
+    for result in results:
+        parity = compare_embeddings(
+            np.vstack([reference["query_embeddings"], reference["chunk_embeddings"]]),
+            np.vstack([result["query_embeddings"], result["chunk_embeddings"]])
+        )
+        print(f"{result['backend']:<14}{result['load_seconds']:>8.2f}{result['query_p50_ms']:>10.2f}"
+              f"{result['query_p95_ms']:>10.2f}{result['chunks_per_second']:>10.1f}"
+              f"{parity['min_cosine']:>10.4f}{parity['mean_cosine']:>10.4f}")
+
+    print(f"\nParity is measured against {reference['backend']}.")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
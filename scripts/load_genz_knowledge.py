@@ -8,6 +8,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import json
+import time
 from src.rag_system import RAGSystem
 
 def load_genz_knowledge():
@@ -27,48 +28,56 @@ def load_genz_knowledge():
         # Initialize RAG system
         rag = RAGSystem()
         
+        items = []
+        
         # Load campus slang
         for slang in genz_data["genz_terminology"]["campus_slang"]:
-            rag.add_knowledge(slang, "LMU Campus Culture", "Campus Slang")
+            items.append({"content": slang, "source": "LMU Campus Culture", "category": "Campus Slang"})
         
         # Load Gen Z expressions
         for expr in genz_data["genz_terminology"]["genz_expressions"]:
-            rag.add_knowledge(expr, "Gen Z Culture", "Expressions")
+            items.append({"content": expr, "source": "Gen Z Culture", "category": "Expressions"})
         
         # Load LMU-specific slang
         for lmu_slang in genz_data["genz_terminology"]["lmu_specific_slang"]:
-            rag.add_knowledge(lmu_slang, "LMU Campus Culture", "LMU Slang")
+            items.append({"content": lmu_slang, "source": "LMU Campus Culture", "category": "LMU Slang"})
         
         # Load popular spots
         for spot in genz_data["campus_culture"]["popular_spots"]:
             content = f"{spot['name']}: {spot['description']} {spot['genz_description']}"
-            rag.add_knowledge(content, "LMU Campus Culture", "Popular Spots")
+            items.append({"content": content, "source": "LMU Campus Culture", "category": "Popular Spots"})
         
         # Load campus events
         for event in genz_data["campus_culture"]["campus_events"]:
             content = f"{event['name']}: {event['description']} {event['genz_description']}"
-            rag.add_knowledge(content, "LMU Campus Culture", "Campus Events")
+            items.append({"content": content, "source": "LMU Campus Culture", "category": "Campus Events"})
         
         # Load student life
         for life in genz_data["campus_culture"]["student_life"]:
             content = f"{life['topic']}: {life['description']} {life['genz_description']}"
-            rag.add_knowledge(content, "LMU Campus Culture", "Student Life")
+            items.append({"content": content, "source": "LMU Campus Culture", "category": "Student Life"})
         
         # Load academic Gen Z phrases
         for phrase in genz_data["academic_genz"]["common_phrases"]:
-            rag.add_knowledge(phrase, "Academic Culture", "Gen Z Academic")
+            items.append({"content": phrase, "source": "Academic Culture", "category": "Gen Z Academic"})
         
         # Load LMU academic slang
         for slang in genz_data["academic_genz"]["lmu_academic_slang"]:
-            rag.add_knowledge(slang, "LMU Academic Culture", "Academic Slang")
+            items.append({"content": slang, "source": "LMU Academic Culture", "category": "Academic Slang"})
         
         # Load campus resources with Gen Z descriptions
         for category, resources in genz_data["campus_resources_genz"].items():
             for resource in resources:
                 content = f"{resource['name']}: {resource['description']} {resource['genz_description']} Location: {resource['location']} Hours: {resource['hours']}"
-                rag.add_knowledge(content, "LMU Campus Resources", category)
+                items.append({"content": content, "source": "LMU Campus Resources", "category": category})
+        
+        # Encode and store everything in batches
+        start_time = time.perf_counter()
+        added = rag.add_knowledge_batch(items)
+        elapsed = time.perf_counter() - start_time
         
         print("✅ Successfully loaded Gen Z LMU knowledge into RAG system!")
+        print(f"⚡ Added {added} chunks in {elapsed:.2f}s ({added / max(elapsed, 1e-9):.1f} chunks/s)")
         print(f"📊 Total knowledge chunks: {len(rag.knowledge_base)}")
         
         return True
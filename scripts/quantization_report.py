@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Recall-versus-memory report for the quantized vector index modes
+
+Scores the knowledge base embeddings (or a synthetic clustered corpus) with every
+quantization mode, with and without full-precision re-scoring, and compares the
+top-k against exact search. Memory is projected to a target corpus size so the
+right mode can be picked for a given app node.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import time
+import numpy as np
+from src.embedding_store import EmbeddingStore, store_path_for
+from src.quantization import QuantizedIndex, create_codec
+from src.vector_index import normalize_vectors
+
+def load_corpus(db_path: str, synthetic: int, dim: int, seed: int) -> EmbeddingStore:
+    """Return an EmbeddingStore holding the knowledge base embeddings, or a synthetic corpus"""
+    store_path = store_path_for(db_path)
+    if not synthetic and os.path.exists(store_path):
+        store = EmbeddingStore(store_path)
+        if len(store):
+            return store
+
+    # Clustered unit vectors behave much more like sentence embeddings than uniform noise
+    rng = np.random.default_rng(seed)
+    count = synthetic or 20000
+    centers = rng.normal(size=(max(count // 200, 8), dim))
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.8 * rng.normal(size=(count, dim))
+    store = EmbeddingStore(os.path.join(tempfile.mkdtemp(), "synthetic.embeddings.f32"))
+    store.append(normalize_vectors(vectors.astype(np.float32)))
+    return store
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Perturbed corpus vectors stand in for paraphrased questions"""
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.choice(len(vectors), min(count, len(vectors)), replace=False)]
+    return normalize_vectors(picks + noise * rng.normal(size=picks.shape).astype(np.float32))
+
+def evaluate(mode: str, rescore: int, store: EmbeddingStore, queries: np.ndarray, truth: list,
+             k: int, pq_m: int) -> dict:
+    """Build one quantized index over the store and measure recall@k, memory and latency"""
+    vectors = store.matrix()
+    rows = np.arange(len(vectors), dtype=np.int64)
+    index = QuantizedIndex(create_codec(mode, pq_m=pq_m), store=store, rescore=rescore,
+                           train_size=min(4096, len(vectors)))
+
+    start = time.perf_counter()
+    index.add(rows, np.asarray(vectors), rows=rows)
+    if not index.codec.trained:
+        index.train()
+    build_seconds = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids, _ = index.search(query, k)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected & set(ids.tolist())) / len(expected))
+
+    return {
+        "mode": mode,
+        "rescore": rescore,
+        "recall": float(np.mean(recalls)),
+        "bytes_per_vector": index.codec.bytes_per_vector(vectors.shape[1]),
+        "build_seconds": build_seconds,
+        "query_p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "query_p95_ms": 1000 * float(np.percentile(latencies, 95))
+    }
+
+def main():
+    """Print the report"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recall vs memory of quantized embedding storage")
+    parser.add_argument("--db", default="data/rag_knowledge.db", help="Knowledge database whose embeddings to use")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of the knowledge base")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Number of evaluation queries")
+    parser.add_argument("--noise", type=float, default=0.3, help="Query perturbation (paraphrase distance)")
+    parser.add_argument("--k", type=int, default=10, help="Recall cut-off")
+    parser.add_argument("--rescore", type=int, default=4, help="Re-scoring shortlist factor to compare against 0")
+    parser.add_argument("--pq-m", type=int, default=48, help="Product quantization sub-vectors")
+    parser.add_argument("--project", type=int, default=5_000_000, help="Corpus size to project memory for")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    store = load_corpus(args.db, args.synthetic, args.dim, args.seed)
+    vectors = np.asarray(store.matrix())
+    count, dim = vectors.shape
+    k = min(args.k, count)
+    queries = make_queries(vectors, args.queries, args.noise, args.seed)
+    exact = queries @ vectors.T
+    truth = [set(np.argsort(-row)[:k].tolist()) for row in exact]
+
+    print(f"📏 {count} vectors x {dim} dims, {len(queries)} queries, recall@{k}, "
+          f"memory projected to {args.project:,} vectors")
+    print(f"\n{'mode':<9}{'rescore':>8}{'recall':>8}{'B/vec':>7}{'proj GB':>9}{'build s':>9}{'p50 ms':>8}{'p95 ms':>8}")
+    print(f"{'float32':<9}{'-':>8}{1.0:>8.3f}{4 * dim:>7}{4 * dim * args.project / 1e9:>9.2f}{'-':>9}{'-':>8}{'-':>8}")
+
+    for mode in ("float16", "int8", "pq"):
+        if mode == "pq" and count < 256:
+            print(f"{mode:<9}  needs at least 256 vectors to train")
+            continue
+        for rescore in sorted({0, args.rescore}):
+            result = evaluate(mode, rescore, store, queries, truth, k, args.pq_m)
+            print(f"{result['mode']:<9}{result['rescore']:>8}{result['recall']:>8.3f}"
+                  f"{result['bytes_per_vector']:>7}{result['bytes_per_vector'] * args.project / 1e9:>9.2f}"
+                  f"{result['build_seconds']:>9.2f}{result['query_p50_ms']:>8.2f}{result['query_p95_ms']:>8.2f}")
+
+    print("\nB/vec counts codes (and int8 scales) only; re-scoring reads float32 rows from the "
+          "memory-mapped store on demand instead of keeping them resident.")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -11,6 +11,7 @@ from src.data_collector import LMUDataCollector
 from src.rag_system import RAGSystem
 from src.utils import logger
 import json
+import time
 
 def setup_knowledge_base():
     """Initialize the knowledge base with LMU data"""
@@ -32,21 +33,24 @@ def setup_knowledge_base():
     
     # Step 3: Load data into RAG system
     print("\n📚 Step 3: Loading data into knowledge base...")
-    total_added = 0
+    batch = []
     
     for category, items in data.items():
         print(f"   Loading {category}...")
         for item in items:
             if isinstance(item, dict) and "content" in item:
-                success = rag.add_knowledge(
-                    item["content"],
-                    item.get("source", ""),
-                    item.get("category", category)
-                )
-                if success:
-                    total_added += 1
+                batch.append({
+                    "content": item["content"],
+                    "source": item.get("source", ""),
+                    "category": item.get("category", category)
+                })
     
-    print(f"✅ Added {total_added} knowledge items to RAG system")
+    start_time = time.perf_counter()
+    total_added = rag.add_knowledge_batch(batch)
+    elapsed = time.perf_counter() - start_time
+    
+    print(f"✅ Added {total_added} chunks from {len(batch)} knowledge items to RAG system in {elapsed:.2f}s "
+          f"({len(batch) / max(elapsed, 1e-9):.1f} items/s)")
     
     # Step 4: Load additional knowledge files if they exist
     print("\n📁 Step 4: Loading additional knowledge files...")
@@ -59,7 +63,7 @@ def setup_knowledge_base():
     for file_path in knowledge_files:
         if os.path.exists(file_path):
             added = rag.update_knowledge_from_file(file_path)
-            print(f"   • Loaded {added} items from {os.path.basename(file_path)}")
+            print(f"   • Loaded {added} new chunks from {os.path.basename(file_path)}")
     
     # Step 5: Update events data
     print("\n🎉 Step 5: Setting up events data...")
@@ -171,22 +175,75 @@ def update_knowledge_base():
     data = collector.collect_all_data()
     
     # Update knowledge base
-    total_updated = 0
+    batch = []
     for category, items in data.items():
         for item in items:
             if isinstance(item, dict) and "content" in item:
-                success = rag.add_knowledge(
-                    item["content"],
-                    item.get("source", ""),
-                    item.get("category", category)
-                )
-                if success:
-                    total_updated += 1
+                batch.append({
+                    "content": item["content"],
+                    "source": item.get("source", ""),
+                    "category": item.get("category", category)
+                })
+    total_updated = rag.add_knowledge_batch(batch)
     
     # Update events
     collector.update_events_file()
     
-    print(f"✅ Updated {total_updated} knowledge items")
+    print(f"✅ Updated knowledge from {len(batch)} items ({total_updated} new chunks)")
+
+def refresh_knowledge_files(directory: str = "data/lmu_knowledge"):
+    """Incrementally re-index the knowledge JSON files (only changed items are embedded)"""
+    print(f"\n🔁 Refreshing knowledge files in {directory}...")
+    
+    rag = RAGSystem()
+    start_time = time.perf_counter()
+    summaries = rag.refresh_knowledge_directory(directory)
+    elapsed = time.perf_counter() - start_time
+    
+    for summary in summaries:
+        name = os.path.basename(summary["file"])
+        if summary["skipped"]:
+            print(f"   • {name}: unchanged")
+        else:
+            print(f"   • {name}: {summary['items_added']} added/changed, {summary['items_removed']} removed, "
+                  f"{summary['chunks_added']} chunks embedded, {summary['chunks_deleted']} chunks deleted")
+    
+    print(f"✅ Refreshed {len(summaries)} files in {elapsed:.2f}s")
+
+def export_knowledge_snapshot(file_path: str):
+    """Write the knowledge base, embeddings included, to a JSONL snapshot"""
+    print(f"\n📦 Exporting knowledge snapshot to {file_path}...")
+    
+    rag = RAGSystem()
+    start_time = time.perf_counter()
+    count = rag.export_snapshot(file_path)
+    
+    print(f"✅ Exported {count} chunks in {time.perf_counter() - start_time:.2f}s")
+
+def import_knowledge_snapshot(file_path: str, force: bool = False):
+    """Bulk-load a JSONL snapshot, reusing its embeddings when the model and backend match"""
+    print(f"\n📥 Importing knowledge snapshot from {file_path}...")
+    
+    rag = RAGSystem()
+    summary = rag.import_snapshot(file_path, force=force)
+    if "error" in summary:
+        print(f"❌ Import failed: {summary['error']}")
+        return
+    
+    how = "re-encoded" if summary["reencoded"] else "stored embeddings reused"
+    print(f"✅ Imported {summary['chunks_added']} new chunks of {summary['chunks_seen']} "
+          f"in {summary['seconds']:.2f}s ({how})")
+
+def compact_knowledge_base():
+    """Remove duplicate knowledge chunks left by earlier re-runs"""
+    print("\n🧹 Compacting knowledge base...")
+    
+    rag = RAGSystem()
+    store_bytes = rag.embedding_store.size_bytes()
+    removed = rag.compact_knowledge()
+    
+    print(f"✅ Removed {removed} duplicate chunks ({len(rag.knowledge_base)} remaining); embedding store "
+          f"{store_bytes / 1e6:.1f} MB -> {rag.embedding_store.size_bytes() / 1e6:.1f} MB")
 
 def main():
     """Main setup function"""
@@ -196,6 +253,15 @@ def main():
     parser.add_argument("--verify", action="store_true", help="Verify existing setup")
     parser.add_argument("--update", action="store_true", help="Update existing knowledge base")
     parser.add_argument("--sample-data", action="store_true", help="Create sample student data")
+    parser.add_argument("--compact", action="store_true", help="Remove duplicate knowledge chunks and reclaim deleted embeddings")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Incrementally re-index data/lmu_knowledge/*.json (for the nightly refresh)")
+    parser.add_argument("--export-snapshot", metavar="PATH",
+                        help="Write chunks and embeddings to a JSONL snapshot (.jsonl.gz to compress)")
+    parser.add_argument("--import-snapshot", metavar="PATH",
+                        help="Bulk-load a snapshot written by --export-snapshot")
+    parser.add_argument("--force", action="store_true",
+                        help="With --import-snapshot: accept a snapshot from another embedding backend (re-encodes it)")
     
     args = parser.parse_args()
     
@@ -205,6 +271,14 @@ def main():
         update_knowledge_base()
     elif args.sample_data:
         create_sample_student_data()
+    elif args.compact:
+        compact_knowledge_base()
+    elif args.refresh:
+        refresh_knowledge_files()
+    elif args.export_snapshot:
+        export_knowledge_snapshot(args.export_snapshot)
+    elif args.import_snapshot:
+        import_knowledge_snapshot(args.import_snapshot, force=args.force)
     else:
         # Full setup
         setup_knowledge_base()
@@ -0,0 +1,277 @@
+"""
+asyncio client for Ollama with bounded concurrency
+
+AsyncLLMHandler mirrors LLMHandler (generate, streaming and health) on an httpx
+AsyncClient, so an API server or batch script can keep many questions in flight
+without parking a thread on each. Ollama serves a handful of generations at a time
+at best, so requests pass through a RequestQueue: at most `llm.async_concurrency`
+run at once and the rest wait in strict arrival order, with their queue wait
+recorded. Prompts, payloads, the health cache and the circuit breaker are shared
+with the wrapped LLMHandler.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+import numpy as np
+from .utils import logger, clean_text
+from .llm_handler import (LLMHandler, get_llm_handler, BREAKER_OPEN_MESSAGE, OLLAMA_DOWN_MESSAGE,
+                          MODEL_MISSING_MESSAGE)
+
+try:
+    import httpx
+except ImportError:  # Optional dependency
+    httpx = None
+
+QUEUE_FULL_MESSAGE = "🚨 I'm getting a lot of questions right now. Please try again in a moment."
+
+class QueueFullError(Exception):
+    """Raised when a RequestQueue already holds its maximum number of waiters"""
+
+class RequestQueue:
+    """FIFO admission control for a fixed number of concurrent requests
+
+    Unlike a bare asyncio.Semaphore, a released slot is handed directly to the
+    longest-waiting request, so a newcomer can never overtake the queue. Must be
+    used from a single event loop.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_waiting: int = 0, latency_window: int = 1024):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_waiting = max_waiting
+        self._active = 0
+        self._waiters = deque()
+        self._waits = deque(maxlen=latency_window)
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self) -> float:
+        """Wait for a slot in arrival order; returns the seconds spent queued"""
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self._admit(0.0)
+            return 0.0
+        if self.max_waiting and len(self._waiters) >= self.max_waiting:
+            self.rejected += 1
+            raise QueueFullError(f"{len(self._waiters)} requests already waiting")
+
+        start = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation; pass it on
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        waited = time.perf_counter() - start
+        self._admit(waited)
+        return waited
+
+    def _admit(self, waited: float):
+        """Record one admission"""
+        self.admitted += 1
+        self._waits.append(waited)
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the duration of the block"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return occupancy, admission counts and queue-wait percentiles in milliseconds"""
+        waits = np.array(self._waits) * 1000
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_p50_ms": float(np.percentile(waits, 50)) if waits.size else None,
+            "wait_p95_ms": float(np.percentile(waits, 95)) if waits.size else None,
+            "wait_max_ms": float(waits.max()) if waits.size else None
+        }
+
+class AsyncLLMHandler:
+    """Async generate/stream/health for Ollama, sharing prompt construction with LLMHandler
+
+    Use as `async with AsyncLLMHandler() as llm:`; the HTTP client is bound to the
+    event loop it is first used on.
+    """
+
+    def __init__(self, handler: Optional[LLMHandler] = None, config_path: str = "config.json",
+                 transport: Optional[Any] = None):
+        if httpx is None:
+            raise ImportError("httpx is required for AsyncLLMHandler (pip install httpx)")
+        self.handler = handler if handler is not None else get_llm_handler(config_path)
+        llm_config = self.handler.config["llm"]
+        self.queue = RequestQueue(llm_config.get("async_concurrency", 4), llm_config.get("async_max_queue", 0))
+        self.health = self.handler.health
+        self._pool_size = llm_config.get("pool_size", 10)
+        self._connect_timeout = llm_config.get("connect_timeout", 3.05)
+        self._transport = transport
+        self._connect_retries = llm_config.get("connect_retries", 2)
+        self._client = None
+        self._refresh_task = None
+
+    @property
+    def client(self):
+        """The AsyncClient, created on first use inside the running loop"""
+        if self._client is None:
+            # httpx transport retries cover connection errors only, matching the sync session
+            transport = self._transport or httpx.AsyncHTTPTransport(retries=self._connect_retries)
+            self._client = httpx.AsyncClient(
+                base_url=self.handler.ollama_url,
+                timeout=httpx.Timeout(self.handler.timeout, connect=self._connect_timeout),
+                limits=httpx.Limits(max_connections=self._pool_size, max_keepalive_connections=self._pool_size),
+                transport=transport
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close the HTTP client once any background probe has finished"""
+        if self._refresh_task is not None:
+            # Cancelling would leave the shared health monitor marked as refreshing
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def refresh_health(self) -> bool:
+        """Probe /api/tags now and update the shared health state; returns reachability"""
+        models = None
+        try:
+            response = await self.client.get("/api/tags", timeout=httpx.Timeout(5, connect=self._connect_timeout))
+            if response.status_code == 200:
+                models = {model["name"] for model in response.json().get("models", [])}
+        except Exception as e:
+            logger.debug(f"Ollama health probe failed: {e}")
+        return self.health.update(models)
+
+    async def health_status(self, refresh: bool = False) -> Dict[str, bool]:
+        """Return Ollama reachability and model availability, probing only on first use or when asked"""
+        age = self.health.age()
+        if refresh or age is None:
+            await self.refresh_health()
+        elif age > self.health.ttl and self.health.begin_refresh():
+            self._refresh_task = asyncio.create_task(self.refresh_health())
+        reachable, available = self.health.cached_status(self.handler.model)
+        return {"ollama_running": reachable, "model_available": available}
+
+    async def _unavailable_message(self) -> Optional[str]:
+        """Return the 🚨 message to answer with instead of generating, or None if Ollama is ready"""
+        if not self.health.allow_request():
+            return BREAKER_OPEN_MESSAGE
+        status = await self.health_status()
+        if not status["ollama_running"]:
+            return OLLAMA_DOWN_MESSAGE
+        if not status["model_available"]:
+            return MODEL_MISSING_MESSAGE.format(model=self.handler.model)
+        return None
+
+    def _prompt(self, user_message: str, context: str, history: Optional[List[Dict]]) -> str:
+        """Clean the inputs and build the prompt exactly as LLMHandler does"""
+        return self.handler._build_prompt(clean_text(user_message), clean_text(context), history)
+
+    async def generate(self, user_message: str, context: str = "", history: List[Dict] = None) -> str:
+        """Generate a complete response"""
+        try:
+            message = await self._unavailable_message()
+            if message:
+                return message
+            payload = self.handler._build_payload(self._prompt(user_message, context, history), stream=False)
+
+            async with self.queue.slot():
+                response = await self.client.post("/api/generate", json=payload)
+            if response.status_code == 200:
+                self.health.record_success()
+                return response.json().get("response", "I'm sorry, I couldn't generate a response.")
+            self.health.record_failure()
+            logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+            return f"API Error: {response.status_code}"
+
+        except QueueFullError:
+            return QUEUE_FULL_MESSAGE
+        except httpx.TimeoutException:
+            self.health.record_failure()
+            return "I'm taking too long to respond. Please try asking your question again."
+        except httpx.HTTPError as e:
+            self.health.record_failure()
+            logger.error(f"Request error: {e}")
+            return "I'm having trouble connecting. Please check if Ollama is running."
+        except Exception as e:
+            logger.error(f"Error generating async response: {e}")
+            return f"Sorry, I encountered an error while processing your request: {str(e)}"
+
+    async def stream(self, user_message: str, context: str = "", history: List[Dict] = None) -> AsyncIterator[str]:
+        """Yield response tokens as Ollama produces them; the queue slot is held until the stream ends"""
+        try:
+            message = await self._unavailable_message()
+            if message:
+                yield message
+                return
+            payload = self.handler._build_payload(self._prompt(user_message, context, history), stream=True)
+
+            async with self.queue.slot():
+                async with self.client.stream("POST", "/api/generate", json=payload) as response:
+                    if response.status_code != 200:
+                        self.health.record_failure()
+                        yield f"API Error: {response.status_code}"
+                        return
+                    self.health.record_success()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        try:
+                            chunk = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if "response" in chunk:
+                            yield chunk["response"]
+                        if chunk.get("done", False):
+                            break
+
+        except QueueFullError:
+            yield QUEUE_FULL_MESSAGE
+        except httpx.HTTPError as e:
+            self.health.record_failure()
+            logger.error(f"Error in async streaming response: {e}")
+            yield f"Error: {str(e)}"
+        except Exception as e:
+            logger.error(f"Error in async streaming response: {e}")
+            yield f"Error: {str(e)}"
+
+    async def generate_batch(self, messages: Sequence[str], contexts: Optional[Sequence[str]] = None) -> List[str]:
+        """Answer many questions concurrently (bounded by the queue), in input order"""
+        contexts = contexts if contexts is not None else [""] * len(messages)
+        return await asyncio.gather(*(self.generate(message, context) for message, context in zip(messages, contexts)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue and health statistics"""
+        return {"queue": self.queue.stats(), "health": self.health.stats()}
@@ -0,0 +1,164 @@
+"""
+In-process caches shared by the RAG and LLM layers
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import numpy as np
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with optional per-entry TTL"""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value and mark it most recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+class SemanticCache:
+    """Thread-safe, size-bounded cache keyed on normalized embeddings, matched by cosine similarity
+
+    A lookup returns the value of the most similar live entry when it scores at
+    least `threshold`. Entries are stamped with a caller-supplied generation; a
+    lookup under a different generation never matches them.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = None, threshold: float = 0.92):
+        self.max_size = max_size
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.threshold = threshold
+        self._vectors = None
+        self._values = [None] * max(max_size, 0)
+        self._stored_at = np.zeros(max(max_size, 0))
+        self._used_at = np.zeros(max(max_size, 0))
+        self._generations = np.full(max(max_size, 0), -1, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _live(self, generation: int, now: float) -> np.ndarray:
+        """Mask of slots holding an unexpired entry of the given generation"""
+        live = self._generations == generation
+        if self.ttl is not None:
+            live &= now - self._stored_at <= self.ttl
+        return live
+
+    def get(self, embedding: np.ndarray, generation: int = 0, default: Any = None) -> Any:
+        """Return the value of the closest live entry at or above the threshold"""
+        with self._lock:
+            now = time.monotonic()
+            if self._vectors is not None:
+                live = self._live(generation, now)
+                if live.any():
+                    scores = np.where(live, self._vectors @ embedding, -np.inf)
+                    slot = int(np.argmax(scores))
+                    if scores[slot] >= self.threshold:
+                        self._used_at[slot] = now
+                        self.hits += 1
+                        return self._values[slot]
+            self.misses += 1
+            return default
+
+    def put(self, embedding: np.ndarray, value: Any, generation: int = 0):
+        """Store a value, replacing a stale or expired slot first and the least recently used one otherwise"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._vectors is None or self._vectors.shape[1] != len(embedding):
+                self._vectors = np.zeros((self.max_size, len(embedding)), dtype=np.float32)
+                self._generations[:] = -1
+            free = ~self._live(generation, now)
+            if free.any():
+                slot = int(np.argmax(free))
+            else:
+                slot = int(np.argmin(self._used_at))
+                self.evictions += 1
+            self._vectors[slot] = embedding
+            self._values[slot] = value
+            self._stored_at[slot] = self._used_at[slot] = now
+            self._generations[slot] = generation
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._generations[:] = -1
+            self._values = [None] * len(self._values)
+
+    def __len__(self) -> int:
+        return int((self._generations >= 0).sum())
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": int((self._generations >= 0).sum()),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
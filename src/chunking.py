@@ -0,0 +1,123 @@
+"""
+Streaming document chunker for the RAG system
+
+Documents are split lazily on sentence boundaries into chunks of at most
+`chunk_size` characters, consecutive chunks sharing up to `chunk_overlap`
+characters. When a token counter is supplied (the embedding model's tokenizer),
+chunks are also capped at `max_tokens` so they fit the model window instead of
+being silently truncated.
+"""
+
+import re
+from collections import deque
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# A sentence-ish unit: up to terminal punctuation followed by whitespace, a newline, or the end
+_SENTENCE = re.compile(r"\S.*?(?:[.!?]+(?=\s|$)|\n|$)", re.DOTALL)
+_WORD = re.compile(r"\S+")
+
+class TextChunker:
+    """Split text into overlapping, window-sized chunks as a generator"""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, max_tokens: Optional[int] = None,
+                 token_counter: Optional[Callable[[str], int]] = None):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+        # Overlap beyond half a chunk would make consecutive chunks mostly identical
+        self.chunk_overlap = max(0, min(chunk_overlap, chunk_size // 2))
+        self.max_tokens = max_tokens if token_counter is not None else None
+        self.token_counter = token_counter
+
+    def _tokens(self, text: str) -> int:
+        return self.token_counter(text) if self.max_tokens is not None else 0
+
+    def _fits(self, chars: int, tokens: int) -> bool:
+        return chars <= self.chunk_size and (self.max_tokens is None or tokens <= self.max_tokens)
+
+    def _units(self, text: str) -> Iterator[Tuple[str, int]]:
+        """Yield (sentence, tokens), breaking sentences that alone exceed the limits at word boundaries"""
+        for match in _SENTENCE.finditer(text):
+            unit = " ".join(match.group().split())
+            if not unit:
+                continue
+            tokens = self._tokens(unit)
+            if self._fits(len(unit), tokens):
+                yield unit, tokens
+            else:
+                yield from self._split_long(unit)
+
+    def _split_long(self, unit: str) -> Iterator[Tuple[str, int]]:
+        words, chars, tokens = [], 0, 0
+        for match in _WORD.finditer(unit):
+            word = match.group()
+            word_tokens = self._tokens(word)
+            if words and not self._fits(chars + 1 + len(word), tokens + word_tokens):
+                yield " ".join(words), tokens
+                words, chars, tokens = [], 0, 0
+            words.append(word)
+            chars += len(word) + (1 if len(words) > 1 else 0)
+            tokens += word_tokens
+        if words:
+            yield " ".join(words), tokens
+
+    def chunks(self, text: str) -> Iterator[str]:
+        """Lazily yield the chunks of one document"""
+        window = deque()
+        chars = tokens = 0
+        for unit, unit_tokens in self._units(text or ""):
+            if window and not self._fits(chars + 1 + len(unit), tokens + unit_tokens):
+                yield " ".join(part for part, _ in window)
+
+                # Carry trailing sentences into the next chunk as overlap, leaving room for `unit`
+                carried = deque()
+                carried_chars = carried_tokens = 0
+                while window:
+                    part, part_tokens = window[-1]
+                    if carried_chars + len(part) > self.chunk_overlap or \
+                            not self._fits(carried_chars + len(part) + 1 + len(unit),
+                                           carried_tokens + part_tokens + unit_tokens):
+                        break
+                    window.pop()
+                    carried.appendleft((part, part_tokens))
+                    carried_chars += len(part) + 1
+                    carried_tokens += part_tokens
+                window, chars, tokens = carried, max(carried_chars - 1, 0), carried_tokens
+
+            chars += len(unit) + (1 if window else 0)
+            tokens += unit_tokens
+            window.append((unit, unit_tokens))
+
+        if window:
+            yield " ".join(part for part, _ in window)
+
+def chunker_for_model(model, chunk_size: int = 1000, chunk_overlap: int = 200) -> TextChunker:
+    """Build a chunker clamped to an embedding model's token window when it exposes one
+
+    sentence-transformers models and OnnxEmbeddingModel both carry a Hugging Face
+    `tokenizer` and an integer `max_seq_length`; two positions go to [CLS]/[SEP].
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    max_seq_length = getattr(model, "max_seq_length", None)
+    if tokenizer is None or not isinstance(max_seq_length, int) or not hasattr(tokenizer, "tokenize"):
+        return TextChunker(chunk_size, chunk_overlap)
+    return TextChunker(chunk_size, chunk_overlap, max_tokens=max_seq_length - 2,
+                       token_counter=lambda text: len(tokenizer.tokenize(text)))
+
+def merge_chunks(chunks: List[str]) -> str:
+    """Join consecutive chunks of one document, dropping the text they overlap on"""
+    merged = ""
+    for chunk in chunks:
+        overlap = 0
+        for size in range(min(len(merged), len(chunk)), 0, -1):
+            # Only whole-word overlaps count, so "...in LA." + "A new..." is not merged
+            at_word_start = size == len(merged) or merged[-size - 1] == " "
+            at_word_end = size == len(chunk) or chunk[size] == " "
+            if at_word_start and at_word_end and merged.endswith(chunk[:size]):
+                overlap = size
+                break
+        if overlap:
+            merged += chunk[overlap:]
+        else:
+            merged = f"{merged} {chunk}" if merged else chunk
+    return merged
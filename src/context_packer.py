@@ -0,0 +1,100 @@
+"""
+Token-budgeted packing of retrieved chunks into a prompt context
+
+Retrieval returns the best chunks regardless of their length, but every context
+token costs prefill time. pack_context fits chunks into a token budget: the best
+hit always goes first, then chunks are taken greedily by MMR gain per token. The
+gain blends relevance with novelty, one minus the chunk's maximum cosine similarity
+to anything already selected (updated for all candidates in one vector operation),
+and near-duplicates of selected chunks are skipped outright. A chunk that no
+longer fits is trimmed at a sentence or word boundary, or dropped when too little
+room is left to be useful.
+"""
+
+import math
+import re
+from typing import Callable, List, Optional, Sequence, Tuple
+import numpy as np
+
+_SENTENCE_END = re.compile(r"[.!?](?=\s)")
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token for English prose)"""
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+def trim_to_tokens(text: str, max_tokens: int, token_counter: Callable[[str], int] = estimate_tokens) -> str:
+    """Cut text to at most max_tokens, preferring to end on a sentence, else a word, boundary"""
+    if token_counter(text) <= max_tokens:
+        return text
+    words = text.split(" ")
+    low, high = 0, len(words)
+    # Longest word prefix that fits (token counts only grow with more words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if token_counter(" ".join(words[:middle]) + " …") <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    trimmed = " ".join(words[:low])
+    if not trimmed:
+        return ""
+
+    sentence_ends = [match.end() for match in _SENTENCE_END.finditer(trimmed + " ")]
+    if sentence_ends and sentence_ends[-1] >= len(trimmed) // 2:
+        return trimmed[:sentence_ends[-1]]
+    return trimmed + " …"
+
+def pack_context(texts: Sequence[str], scores: Sequence[float], token_budget: int,
+                 embeddings: Optional[np.ndarray] = None, overheads: Optional[Sequence[int]] = None,
+                 mmr_lambda: float = 0.7, max_redundancy: float = 0.9, min_tokens: int = 32,
+                 token_counter: Callable[[str], int] = estimate_tokens) -> List[Tuple[int, str]]:
+    """Select (index, text) pairs fitting token_budget, returned in their original order
+
+    `scores` are relevance scores on any scale (min-max normalized here);
+    `embeddings` are L2-normalized rows used for redundancy suppression;
+    `overheads` are per-chunk token costs of the formatting around the text.
+    Chunks at least `max_redundancy` similar to a selected chunk are skipped.
+    """
+    count = len(texts)
+    if count == 0 or token_budget <= 0:
+        return []
+
+    scores = np.asarray(scores, dtype=np.float64)
+    spread = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones(count)
+    tokens = np.array([token_counter(text) for text in texts], dtype=np.float64)
+    overheads = np.zeros(count) if overheads is None else np.asarray(overheads, dtype=np.float64)
+    similarity = embeddings @ embeddings.T if embeddings is not None and len(embeddings) == count else None
+
+    redundancy = np.zeros(count)
+    available = np.ones(count, dtype=bool)
+    remaining = token_budget
+    selected = []
+
+    while available.any() and remaining > 0:
+        if not selected:
+            # The best hit always leads; density ordering would favour short marginal chunks
+            value = np.where(available, scores, -np.inf)
+        else:
+            gain = mmr_lambda * relevance + (1 - mmr_lambda) * (1 - redundancy)
+            value = np.where(available & (redundancy < max_redundancy), gain / (tokens + overheads), -np.inf)
+        pick = int(np.argmax(value))
+        if not np.isfinite(value[pick]):
+            break
+        available[pick] = False
+
+        room = remaining - int(overheads[pick])
+        text = texts[pick]
+        if tokens[pick] > room:
+            if room < min_tokens:
+                continue
+            text = trim_to_tokens(text, room, token_counter)
+            if not text:
+                continue
+
+        selected.append((pick, text))
+        remaining -= int(overheads[pick]) + token_counter(text)
+        if similarity is not None:
+            redundancy = np.maximum(redundancy, similarity[pick])
+
+    return sorted(selected)
@@ -0,0 +1,158 @@
+"""
+Append-only, memory-mapped embedding storage
+
+Embeddings live in one raw little-endian float32 file next to the knowledge database,
+one L2-normalized row per chunk. SQLite only records each chunk's row number, so
+every worker process maps the same file and shares it through the OS page cache
+instead of holding a private copy of every BLOB.
+"""
+
+import os
+import threading
+from typing import Callable, Optional
+import numpy as np
+from .vector_index import normalize_vectors
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+class EmbeddingStore:
+    """Append-only float32 matrix file exposed as zero-copy np.memmap views"""
+
+    MAGIC = b"LMUEMB01"
+    HEADER_SIZE = 64
+    DTYPE = np.dtype("<f4")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dim = None
+        self._lock = threading.Lock()
+        self._view = None
+        if os.path.exists(path) and os.path.getsize(path) >= self.HEADER_SIZE:
+            self._read_header()
+
+    def _read_header(self):
+        """Read the embedding dimension from the file header"""
+        with open(self.path, "rb") as f:
+            header = f.read(self.HEADER_SIZE)
+        if header[:len(self.MAGIC)] != self.MAGIC:
+            raise ValueError(f"{self.path} is not an embedding store")
+        self.dim = int(np.frombuffer(header, dtype="<u4", count=1, offset=len(self.MAGIC))[0])
+
+    def _header(self, dim: int) -> bytes:
+        header = self.MAGIC + np.array([dim], dtype="<u4").tobytes()
+        return header.ljust(self.HEADER_SIZE, b"\0")
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * self.DTYPE.itemsize
+
+    def __len__(self) -> int:
+        """Number of complete rows on disk (including rows written by other processes)"""
+        if self.dim is None:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) < self.HEADER_SIZE:
+                return 0
+            self._read_header()
+        return max(0, (os.path.getsize(self.path) - self.HEADER_SIZE) // self.row_bytes)
+
+    def append(self, vectors: np.ndarray) -> np.ndarray:
+        """Normalize and append vectors, returning their row numbers"""
+        vectors = normalize_vectors(vectors).astype(self.DTYPE, copy=False)
+        count, dim = vectors.shape
+
+        with self._lock:
+            mode = "r+b" if os.path.exists(self.path) else "w+b"
+            with open(self.path, mode) as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    size = f.seek(0, os.SEEK_END)
+                    if size < self.HEADER_SIZE:
+                        f.seek(0)
+                        f.write(self._header(dim))
+                        f.truncate(self.HEADER_SIZE)
+                        self.dim = dim
+                        size = self.HEADER_SIZE
+                    elif self.dim is None:
+                        self._read_header()
+
+                    if dim != self.dim:
+                        raise ValueError(f"Embedding dimension {dim} does not match store dimension {self.dim}")
+
+                    # Drop a torn row left by a crash mid-append before writing
+                    start = (size - self.HEADER_SIZE) // self.row_bytes
+                    end_of_rows = self.HEADER_SIZE + start * self.row_bytes
+                    if end_of_rows != size:
+                        f.truncate(end_of_rows)
+                    f.seek(end_of_rows)
+                    f.write(vectors.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+        return np.arange(start, start + count, dtype=np.int64)
+
+    def compact(self, rows, before_replace: Optional[Callable[[], None]] = None) -> int:
+        """Rewrite the file keeping only `rows` (renumbered 0..n-1 in the given order)
+
+        `before_replace` runs once the new file is fully written but before it takes
+        the old file's place (e.g. to commit the matching row renumbering); if it
+        raises, the old file is kept. Processes that still map the old file keep a
+        valid view of it but must reload their row numbers. Returns rows reclaimed.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        tmp_path = self.path + ".compact"
+        with self._lock:
+            with open(self.path, "r+b") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    total = len(self)
+                    with open(tmp_path, "wb") as out:
+                        out.write(self._header(self.dim))
+                        matrix = self.matrix()
+                        for start in range(0, len(rows), 4096):
+                            out.write(np.ascontiguousarray(matrix[rows[start:start + 4096]]).tobytes())
+                        out.flush()
+                        os.fsync(out.fileno())
+                    try:
+                        if before_replace is not None:
+                            before_replace()
+                    except Exception:
+                        os.remove(tmp_path)
+                        raise
+                    self._view = None
+                    os.replace(tmp_path, self.path)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return total - len(rows)
+
+    def matrix(self) -> np.ndarray:
+        """Read-only (rows, dim) memmap of every complete row, remapped when the file grows"""
+        rows = len(self)
+        if rows == 0:
+            return np.zeros((0, self.dim or 0), dtype=self.DTYPE)
+
+        view = self._view
+        if view is None or view.shape[0] != rows:
+            view = np.memmap(self.path, dtype=self.DTYPE, mode="r", offset=self.HEADER_SIZE,
+                             shape=(rows, self.dim))
+            self._view = view
+        return view
+
+    def get(self, rows) -> np.ndarray:
+        """Copy the given rows out of the store"""
+        return np.asarray(self.matrix()[np.asarray(rows, dtype=np.int64)])
+
+    def size_bytes(self) -> int:
+        """On-disk size of the store"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+def store_path_for(db_path: str) -> str:
+    """Return the embedding store file that belongs to a knowledge database"""
+    return os.path.splitext(db_path)[0] + ".embeddings.f32"
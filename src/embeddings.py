@@ -0,0 +1,189 @@
+"""
+Embedding backends for the RAG system
+
+The default backend is sentence-transformers on PyTorch. OnnxEmbeddingModel runs the
+same MiniLM encoder through ONNX Runtime (optionally with dynamic int8 weight
+quantization), which is considerably faster on CPU-only machines. Both expose
+`encode(texts, batch_size=...)` returning an (n, dim) float32 array.
+"""
+
+import importlib.util
+import inspect
+import os
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional
+from .utils import logger
+from .vector_index import normalize_vectors
+
+try:
+    import onnxruntime
+except ImportError:  # Optional dependency
+    onnxruntime = None
+
+ONNX_INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+def _repository_id(model_name: str) -> str:
+    """Map short sentence-transformers names like all-MiniLM-L6-v2 to hub ids"""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+class OnnxEmbeddingModel:
+    """Mean-pooled transformer sentence embeddings served by ONNX Runtime
+
+    The first use exports the Hugging Face model to ONNX (this needs torch and
+    transformers once) and, when `quantize` is set, writes an int8 copy with
+    dynamic quantization. Later runs load the cached files from `cache_dir`.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache_dir: str = "data/models",
+                 quantize: bool = True, max_seq_length: int = 256, num_threads: Optional[int] = None):
+        if onnxruntime is None:
+            raise ImportError("onnxruntime is not installed")
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_seq_length = max_seq_length
+        self.model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        os.makedirs(self.model_dir, exist_ok=True)
+
+        source = self.model_dir if os.path.exists(os.path.join(self.model_dir, "tokenizer_config.json")) \
+            else _repository_id(model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(source)
+        if source != self.model_dir:
+            self.tokenizer.save_pretrained(self.model_dir)
+
+        self.onnx_path = self._ensure_onnx_file()
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(self.onnx_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = [node.name for node in self.session.get_inputs()]
+        logger.info(f"Loaded ONNX embedding model {self.onnx_path}")
+
+    def _ensure_onnx_file(self) -> str:
+        """Export (and quantize) the model once, returning the file to serve"""
+        fp32_path = os.path.join(self.model_dir, "model.onnx")
+        int8_path = os.path.join(self.model_dir, "model.int8.onnx")
+
+        if not os.path.exists(fp32_path):
+            self._export(fp32_path)
+
+        if not self.quantize:
+            return fp32_path
+
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            logger.info(f"Quantizing {fp32_path} to int8")
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        return int8_path
+
+    def _export(self, path: str):
+        """Export the Hugging Face encoder to ONNX with dynamic batch/sequence axes"""
+        import torch
+        from transformers import AutoModel
+
+        logger.info(f"Exporting {self.model_name} to ONNX at {path}")
+        model = AutoModel.from_pretrained(_repository_id(self.model_name))
+        model.eval()
+
+        sample = self.tokenizer(["export sample"], return_tensors="pt")
+        input_names = [name for name in ONNX_INPUT_NAMES if name in sample]
+
+        class EncoderOutput(torch.nn.Module):
+            """Call the encoder with keyword inputs and return only the token embeddings"""
+
+            def __init__(self, encoder):
+                super().__init__()
+                self.encoder = encoder
+
+            def forward(self, *inputs):
+                return self.encoder(**dict(zip(input_names, inputs))).last_hidden_state
+
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+        export_kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False
+
+        tmp_path = path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                EncoderOutput(model),
+                tuple(sample[name] for name in input_names),
+                tmp_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                **export_kwargs
+            )
+        os.replace(tmp_path, path)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Return the embedding width"""
+        return int(self.session.get_outputs()[0].shape[-1])
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Embed texts with mean pooling and L2 normalization, like sentence-transformers"""
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        # Sort by length so each batch pads as little as possible
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        output = None
+        for start in range(0, len(texts), batch_size):
+            positions = order[start:start + batch_size]
+            tokens = self.tokenizer(
+                [texts[i] for i in positions],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: tokens[name].astype(np.int64) for name in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = tokens["attention_mask"][..., np.newaxis].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if output is None:
+                output = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            output[positions] = pooled
+
+        return normalize_vectors(output)
+
+def onnx_backend_available() -> bool:
+    """Whether OnnxEmbeddingModel's runtime dependencies are installed (else load_embedding_model falls back)"""
+    return onnxruntime is not None and importlib.util.find_spec("transformers") is not None
+
+def load_embedding_model(model_name: str, backend: str = "sentence-transformers",
+                         sentence_transformer_loader: Optional[Callable] = None, **options):
+    """Load the configured embedding backend, falling back to sentence-transformers
+
+    `sentence_transformer_loader` returns the SentenceTransformer class; it is only
+    called when that backend is used, so the ONNX path never imports torch.
+    """
+    if backend == "onnx":
+        try:
+            return OnnxEmbeddingModel(model_name, **options)
+        except ImportError as e:
+            logger.warning(f"ONNX embedding backend unavailable ({e}), using sentence-transformers")
+    elif backend != "sentence-transformers":
+        logger.warning(f"Unknown embedding backend '{backend}', using sentence-transformers")
+
+    if sentence_transformer_loader is None:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    return sentence_transformer_loader()(model_name)
+
+def compare_embeddings(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, Any]:
+    """Row-wise cosine similarity between two embedding matrices of the same texts"""
+    reference = normalize_vectors(reference)
+    candidate = normalize_vectors(candidate)
+    cosines = np.sum(reference * candidate, axis=1)
+    return {
+        "count": int(len(cosines)),
+        "mean_cosine": float(cosines.mean()) if len(cosines) else None,
+        "min_cosine": float(cosines.min()) if len(cosines) else None
+    }
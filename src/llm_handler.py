@@ -3,62 +3,234 @@ LLM Handler for interfacing with Ollama and LLaMA 3.2
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import importlib
 import json
+import os
+import sys
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from .utils import logger, load_config, clean_text
-from .personality_config import generate_system_prompt, get_personality_params
+from . import personality_config
+
+BREAKER_OPEN_MESSAGE = "🚨 My brain (Ollama) isn't responding right now. Please try again in a moment."
+OLLAMA_DOWN_MESSAGE = "🚨 I'm having trouble connecting to my brain (Ollama). Please make sure Ollama is running with: `ollama serve`"
+MODEL_MISSING_MESSAGE = "🚨 The {model} model isn't available. Please run: `ollama pull {model}`"
+
+_sessions: Dict[Tuple[int, int], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+def get_session(pool_size: int = 10, connect_retries: int = 2) -> requests.Session:
+    """Return the process-wide keep-alive session for Ollama traffic
+
+    Connections are pooled per host and reused across handlers and threads. Only
+    connection errors are retried: the request never reached Ollama, so even a
+    generation POST is safe to resend, while read errors and HTTP statuses are not.
+    """
+    key = (pool_size, connect_retries)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            retry = Retry(total=None, connect=connect_retries, read=0, status=0, other=0,
+                          backoff_factor=0.1, raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
+
+class OllamaHealth:
+    """Cached Ollama reachability and model list with a consecutive-failure circuit breaker
+
+    One GET /api/tags answers both "is Ollama up" and "is the model pulled"; the answer
+    is reused for `ttl` seconds and refreshed in a background thread once stale, so chat
+    turns never wait on it after the first probe. After `failure_threshold` consecutive
+    failed probes or generations the breaker opens and requests fail fast for `cooldown`
+    seconds, after which a single trial request is let through on a fresh probe.
+    """
+
+    def __init__(self, url: str, ttl: float = 30, failure_threshold: int = 3, cooldown: float = 30,
+                 probe_timeout: Any = 5, session: Optional[requests.Session] = None):
+        self.url = url
+        self.session = session if session is not None else get_session()
+        self.ttl = ttl
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._reachable = False
+        self._models = set()
+        self._checked_at = None
+        self._failures = 0
+        self._opened_at = None
+        self.probes = 0
+        self.fast_failures = 0
+
+    def refresh(self) -> bool:
+        """Probe /api/tags now and update the cached state; returns reachability"""
+        models = None
+        try:
+            response = self.session.get(f"{self.url}/api/tags", timeout=self.probe_timeout)
+            if response.status_code == 200:
+                models = {model["name"] for model in response.json().get("models", [])}
+        except Exception as e:
+            logger.debug(f"Ollama health probe failed: {e}")
+        return self.update(models)
+
+    def update(self, models: Optional[set]) -> bool:
+        """Record a probe result (the model names, or None if the probe failed)"""
+        with self._lock:
+            self.probes += 1
+            self._checked_at = time.monotonic()
+            self._reachable = models is not None
+            if models is not None:
+                self._models = models
+            self._refreshing = False
+        # Only a successful generation closes the breaker; Ollama can list tags yet time out generating
+        if models is None:
+            self.record_failure()
+        return models is not None
+
+    def begin_refresh(self) -> bool:
+        """Claim the single in-flight background probe; False if one is already running"""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last probe, or None if never probed"""
+        with self._lock:
+            return time.monotonic() - self._checked_at if self._checked_at is not None else None
+
+    def status(self, model: str) -> Tuple[bool, bool]:
+        """Return (reachable, model available), probing synchronously only on first use"""
+        age = self.age()
+        if age is None:
+            self.refresh()
+        elif age > self.ttl and self.begin_refresh():
+            threading.Thread(target=self.refresh, name="ollama-health", daemon=True).start()
+        return self.cached_status(model)
+
+    def cached_status(self, model: str) -> Tuple[bool, bool]:
+        """Return (reachable, model available) from the last probe without probing"""
+        with self._lock:
+            reachable = self._reachable
+            available = reachable and model in self._models
+            models = sorted(self._models)
+        if reachable and not available:
+            logger.warning(f"Model {model} not found. Available models: {models}")
+        return reachable, available
+
+    def allow_request(self) -> bool:
+        """False while the breaker is open; lets a single trial through once the cool-down ends"""
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.cooldown:
+                # Half-open: restart the window so concurrent callers keep failing fast, and
+                # forget the cached "unreachable" so the trial probes synchronously
+                self._opened_at = now
+                self._checked_at = None
+                return True
+            self.fast_failures += 1
+            return False
+
+    def record_success(self):
+        """Close the breaker"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        """Count a failure, opening the breaker at the threshold and marking the cached state stale"""
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Ollama circuit breaker open for {self.cooldown}s after {self._failures} failures")
+                self._opened_at = time.monotonic()
+            if self._checked_at is not None:
+                self._checked_at = min(self._checked_at, time.monotonic() - self.ttl - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the cached state and breaker counters"""
+        with self._lock:
+            return {
+                "reachable": self._reachable,
+                "models": sorted(self._models),
+                "age_seconds": time.monotonic() - self._checked_at if self._checked_at is not None else None,
+                "consecutive_failures": self._failures,
+                "breaker_open": self._failures >= self.failure_threshold,
+                "probes": self.probes,
+                "fast_failures": self.fast_failures
+            }
+
+_health_monitors: Dict[str, OllamaHealth] = {}
+_health_monitors_lock = threading.Lock()
+
+def get_health_monitor(url: str, llm_config: Dict[str, Any]) -> OllamaHealth:
+    """Return the process-wide health monitor for an Ollama URL (handlers are short-lived)"""
+    with _health_monitors_lock:
+        monitor = _health_monitors.get(url)
+        if monitor is None:
+            monitor = OllamaHealth(
+                url,
+                ttl=llm_config.get("health_ttl", 30),
+                failure_threshold=llm_config.get("breaker_failures", 3),
+                cooldown=llm_config.get("breaker_cooldown", 30),
+                probe_timeout=(llm_config.get("connect_timeout", 3.05), 5),
+                session=get_session(llm_config.get("pool_size", 10), llm_config.get("connect_retries", 2))
+            )
+            _health_monitors[url] = monitor
+        return monitor
 
 class LLMHandler:
-    def __init__(self):
+    def __init__(self, config_path: str = "config.json"):
         """Initialize the LLM handler"""
-        self.config = load_config()
+        self.config = load_config(config_path)
         self.ollama_url = "http://localhost:11434"
         self.model = self.config["llm"]["model"]
         self.temperature = self.config["llm"]["temperature"]
         self.max_tokens = self.config["llm"]["max_tokens"]
         self.timeout = self.config["llm"]["timeout"]
+        # (connect, read): a dead Ollama should fail in seconds, a slow generation may take the full timeout
+        self.request_timeout = (self.config["llm"].get("connect_timeout", 3.05), self.timeout)
+        self.session = get_session(self.config["llm"].get("pool_size", 10), self.config["llm"].get("connect_retries", 2))
+        self.health = get_health_monitor(self.ollama_url, self.config["llm"])
         
         # Load personality configuration
-        self.system_prompt = generate_system_prompt()
-        self.personality_params = get_personality_params()
+        self.system_prompt = personality_config.generate_system_prompt()
+        self.personality_params = personality_config.get_personality_params()
 
     def check_ollama_connection(self) -> bool:
-        """Check if Ollama is running and accessible"""
-        try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except requests.exceptions.RequestException:
-            return False
+        """Check if Ollama is running and accessible (cached, see OllamaHealth)"""
+        return self.health.status(self.model)[0]
 
     def ensure_model_available(self) -> bool:
-        """Ensure the LLaMA model is available"""
-        try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=10)
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                available_models = [model["name"] for model in models]
-                
-                if self.model in available_models:
-                    return True
-                else:
-                    logger.warning(f"Model {self.model} not found. Available models: {available_models}")
-                    return False
-            return False
-        except Exception as e:
-            logger.error(f"Error checking model availability: {e}")
-            return False
+        """Ensure the LLaMA model is available (cached, see OllamaHealth)"""
+        return self.health.status(self.model)[1]
 
     def generate_response(self, user_message: str, context: str = "", history: List[Dict] = None) -> str:
         """Generate a response using the LLM"""
         try:
+            # Fail fast while Ollama keeps failing instead of waiting out a timeout per user
+            if not self.health.allow_request():
+                return BREAKER_OPEN_MESSAGE
+            
             # Check Ollama connection
             if not self.check_ollama_connection():
-                return "🚨 I'm having trouble connecting to my brain (Ollama). Please make sure Ollama is running with: `ollama serve`"
+                return OLLAMA_DOWN_MESSAGE
             
             # Check model availability
             if not self.ensure_model_available():
-                return f"🚨 The {self.model} model isn't available. Please run: `ollama pull {self.model}`"
+                return MODEL_MISSING_MESSAGE.format(model=self.model)
             
             # Clean the input
             user_message = clean_text(user_message)
@@ -98,38 +270,44 @@ class LLMHandler:
         
         return "\n".join(prompt_parts)
 
+    def _build_payload(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        """Build the /api/generate request body with the personality parameters"""
+        options = {
+            "num_predict": self.max_tokens,
+            **self.personality_params  # Spread personality parameters
+        }
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": options
+        }
+
     def _call_ollama_api(self, prompt: str) -> str:
         """Make the actual API call to Ollama with enhanced parameters for personality"""
         try:
-            # Use personality parameters from configuration
-            options = {
-                "num_predict": self.max_tokens,
-                **self.personality_params  # Spread personality parameters
-            }
-            
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": options
-            }
+            payload = self._build_payload(prompt, stream=False)
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.ollama_url}/api/generate",
                 json=payload,
-                timeout=self.timeout
+                timeout=self.request_timeout
             )
             
             if response.status_code == 200:
+                self.health.record_success()
                 result = response.json()
                 return result.get("response", "I'm sorry, I couldn't generate a response.")
             else:
+                self.health.record_failure()
                 logger.error(f"Ollama API error: {response.status_code} - {response.text}")
                 return f"API Error: {response.status_code}"
                 
         except requests.exceptions.Timeout:
+            self.health.record_failure()
             return "I'm taking too long to respond. Please try asking your question again."
         except requests.exceptions.RequestException as e:
+            self.health.record_failure()
             logger.error(f"Request error: {e}")
             return "I'm having trouble connecting. Please check if Ollama is running."
         except Exception as e:
@@ -137,48 +315,47 @@ class LLMHandler:
             return f"An unexpected error occurred: {str(e)}"
 
     def generate_streaming_response(self, user_message: str, context: str = "", history: List[Dict] = None):
-        """Generate a streaming response (for future use)"""
+        """Generate a streaming response, yielding tokens as Ollama produces them"""
         try:
+            if not self.health.allow_request():
+                yield BREAKER_OPEN_MESSAGE
+                return
+            
             if not self.check_ollama_connection():
                 yield "🚨 I'm having trouble connecting to my brain (Ollama). Please make sure Ollama is running."
                 return
             
-            prompt = self._build_prompt(user_message, context, history)
-            
-            # Use personality parameters for streaming too
-            options = {
-                "num_predict": self.max_tokens,
-                **self.personality_params
-            }
+            prompt = self._build_prompt(clean_text(user_message), clean_text(context), history)
             
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": True,
-                "options": options
-            }
+            payload = self._build_payload(prompt, stream=True)
             
-            response = requests.post(
+            # Closing the response hands the connection back to the pool even if the caller stops early
+            with self.session.post(
                 f"{self.ollama_url}/api/generate",
                 json=payload,
                 stream=True,
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            chunk = json.loads(line)
-                            if "response" in chunk:
-                                yield chunk["response"]
-                            if chunk.get("done", False):
-                                break
-                        except json.JSONDecodeError:
-                            continue
-            else:
-                yield f"API Error: {response.status_code}"
+                timeout=self.request_timeout
+            ) as response:
+                if response.status_code == 200:
+                    self.health.record_success()
+                    for line in response.iter_lines():
+                        if line:
+                            try:
+                                chunk = json.loads(line)
+                                if "response" in chunk:
+                                    yield chunk["response"]
+                                if chunk.get("done", False):
+                                    break
+                            except json.JSONDecodeError:
+                                continue
+                else:
+                    self.health.record_failure()
+                    yield f"API Error: {response.status_code}"
                 
+        except requests.exceptions.RequestException as e:
+            self.health.record_failure()
+            logger.error(f"Error in streaming response: {e}")
+            yield f"Error: {str(e)}"
         except Exception as e:
             logger.error(f"Error in streaming response: {e}")
             yield f"Error: {str(e)}"
@@ -193,7 +370,8 @@ class LLMHandler:
         }
         
         try:
-            # Test Ollama connection
+            # Test Ollama connection (always a fresh probe, not the cached state)
+            self.health.refresh()
             status["ollama_running"] = self.check_ollama_connection()
             if not status["ollama_running"]:
                 status["error_message"] = "Ollama is not running. Start it with: ollama serve"
@@ -217,6 +395,41 @@ class LLMHandler:
         
         return status
 
+def _mtime(path: str) -> Optional[int]:
+    """File modification time in nanoseconds, or None if the file is missing"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def handler_fingerprint(config_path: str = "config.json") -> Tuple:
+    """Identify the inputs an LLMHandler is built from: config.json and the personality module"""
+    return (os.path.abspath(config_path), _mtime(config_path), _mtime(personality_config.__file__))
+
+_shared_handlers: Dict[str, Tuple[Tuple, LLMHandler]] = {}
+_shared_handlers_lock = threading.Lock()
+
+def get_llm_handler(config_path: str = "config.json") -> LLMHandler:
+    """Return the process-wide LLMHandler, rebuilt only after config.json or personality_config changes
+
+    Handlers are stateless once built (HTTP state lives in the shared session and
+    health monitor), so one instance serves every thread; a lookup costs two stats.
+    """
+    global personality_config
+    fingerprint = handler_fingerprint(config_path)
+    with _shared_handlers_lock:
+        cached = _shared_handlers.get(fingerprint[0])
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        if cached is not None and cached[0][2] != fingerprint[2]:
+            logger.info("personality_config changed, reloading it")
+            # Streamlit's file watcher may already have dropped the stale module from sys.modules
+            module = sys.modules.get(personality_config.__name__)
+            personality_config = importlib.reload(module) if module is not None else importlib.import_module(personality_config.__name__)
+        handler = LLMHandler(config_path)
+        _shared_handlers[fingerprint[0]] = (fingerprint, handler)
+        return handler
+
 # Quick test function
 def test_llm_handler():
     """Test the LLM handler functionality"""
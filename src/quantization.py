@@ -0,0 +1,354 @@
+"""
+Quantized vector storage and scoring for RAG retrieval
+
+A float32 MiniLM embedding costs 1.5 KB. QuantizedIndex keeps compressed codes
+instead and scores them directly:
+
+- float16: half precision, 2 bytes per dimension, near-lossless
+- int8: per-vector scaled int8, 1 byte per dimension plus one float32 scale
+- pq: product quantization, one byte per sub-vector, scored with asymmetric
+  distance tables (the query stays float32, only the corpus is quantized)
+
+The top candidates can optionally be re-scored in full precision from the shared
+EmbeddingStore, which recovers nearly all of the recall lost to quantization.
+"""
+
+import os
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+from .utils import logger
+from .vector_index import VectorIndex, PartitionMap, normalize_vectors, top_k_rows, _empty_results
+
+# Rows converted back to float32 at a time while scoring, bounding temporary memory
+SCORE_BLOCK = 4096
+
+class Codec:
+    """Base class: turns normalized float32 vectors into compact codes and scores queries against them"""
+
+    name = "base"
+    trained = True
+
+    @property
+    def signature(self) -> str:
+        """Identifies the code format, so persisted codes from other settings are rebuilt"""
+        return self.name
+
+    def train(self, vectors: np.ndarray):
+        """Fit the codec to representative vectors (no-op for scalar codecs)"""
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Return (codes, per-vector scales or None)"""
+        raise NotImplementedError
+
+    def score(self, queries: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        """Return (queries, codes) approximate inner products"""
+        raise NotImplementedError
+
+    def bytes_per_vector(self, dim: int) -> int:
+        raise NotImplementedError
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Trained parameters to persist alongside the codes"""
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        """Restore parameters written by state()"""
+
+class Float16Codec(Codec):
+    """Half-precision copies of the vectors"""
+
+    name = "float16"
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        return vectors.astype(np.float16), None
+
+    def score(self, queries: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        return queries @ codes.astype(np.float32).T
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return 2 * dim
+
+class Int8Codec(Codec):
+    """Symmetric int8 codes with one scale per vector (max |component| / 127)"""
+
+    name = "int8"
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def score(self, queries: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        return (queries @ codes.astype(np.float32).T) * scales
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim + 4
+
+class ProductQuantizer(Codec):
+    """Product quantization: `m` sub-vectors, each replaced by the id of its nearest of 2**bits centroids"""
+
+    name = "pq"
+
+    def __init__(self, m: int = 48, bits: int = 8, train_iterations: int = 10, seed: int = 0):
+        if not 1 <= bits <= 8:
+            raise ValueError("pq_bits must be between 1 and 8")
+        self.m = m
+        self.ksub = 2 ** bits
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.codebooks = None
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def signature(self) -> str:
+        return f"pq-{self.m}x{self.ksub}"
+
+    def _subspaces(self, dim: int) -> int:
+        """Largest sub-vector count <= m that divides the dimension"""
+        return max(m for m in range(1, min(self.m, dim) + 1) if dim % m == 0)
+
+    def train(self, vectors: np.ndarray):
+        """Fit one k-means codebook per sub-space on (a sample of) the vectors"""
+        count, dim = vectors.shape
+        if count < self.ksub:
+            raise ValueError(f"Product quantization needs at least {self.ksub} training vectors, got {count}")
+        m = self._subspaces(dim)
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(count, min(count, self.ksub * 32), replace=False)]
+        sub = sample.reshape(len(sample), m, dim // m)
+
+        codebooks = np.empty((m, self.ksub, dim // m), dtype=np.float32)
+        for j in range(m):
+            points = np.ascontiguousarray(sub[:, j, :])
+            centroids = points[rng.choice(len(points), self.ksub, replace=False)].copy()
+            for _ in range(self.train_iterations):
+                assignments = self._nearest(points, centroids)
+                counts = np.bincount(assignments, minlength=self.ksub)
+                sums = np.stack([np.bincount(assignments, weights=points[:, d], minlength=self.ksub)
+                                 for d in range(points.shape[1])], axis=1)
+                # Empty clusters keep their previous centroid
+                centroids = np.where((counts == 0)[:, np.newaxis], centroids,
+                                     sums / np.maximum(counts, 1)[:, np.newaxis]).astype(np.float32)
+            codebooks[j] = centroids
+        self.codebooks = codebooks
+
+    @staticmethod
+    def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Index of the closest centroid (squared L2) for each point"""
+        distances = (centroids ** 2).sum(axis=1) - 2 * points @ centroids.T
+        return np.argmin(distances, axis=1)
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        m, _, dsub = self.codebooks.shape
+        sub = vectors.reshape(len(vectors), m, dsub)
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for j in range(m):
+            codes[:, j] = self._nearest(np.ascontiguousarray(sub[:, j, :]), self.codebooks[j])
+        return codes, None
+
+    def score(self, queries: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        # Asymmetric distance: per query, an (m, ksub) table of sub-vector inner products
+        m, _, dsub = self.codebooks.shape
+        tables = np.einsum("qmd,mkd->qmk", queries.reshape(len(queries), m, dsub), self.codebooks)
+        subspaces = np.arange(m)
+        return np.stack([table[subspaces, codes].sum(axis=1) for table in tables]).astype(np.float32)
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return self._subspaces(dim)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks} if self.trained else {}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.codebooks = state.get("codebooks")
+
+def create_codec(mode: str = "int8", pq_m: int = 48, pq_bits: int = 8):
+    """Build the codec for a rag.index.quantization mode"""
+    if mode == "float16":
+        return Float16Codec()
+    if mode == "int8":
+        return Int8Codec()
+    if mode == "pq":
+        return ProductQuantizer(m=pq_m, bits=pq_bits)
+    raise ValueError(f"Unknown quantization mode '{mode}'")
+
+class QuantizedIndex(VectorIndex):
+    """Exact-scan index over quantized codes, with optional full-precision re-scoring
+
+    `rescore` > 0 re-scores the best k * rescore candidates against float32 rows
+    of the EmbeddingStore. Product quantization needs training data: until
+    `train_size` vectors have been added they are kept in float32 and scanned
+    exactly, like an untrained IVFIndex.
+    """
+
+    kind = "quantized"
+    exact = False
+
+    def __init__(self, codec, store=None, rescore: int = 4, train_size: int = 4096):
+        self.codec = codec
+        self.store = store
+        self.rescore = rescore
+        self.train_size = max(train_size, getattr(codec, "ksub", 0))
+        self.reset()
+
+    def reset(self):
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._codes = None
+        self._scales = None
+        self._raw = None  # float32 vectors waiting for the codec to be trained
+        self._size = 0
+        self._partitions = PartitionMap()
+
+    def _columns(self) -> Dict[str, Optional[np.ndarray]]:
+        return {"_ids": self._ids, "_rows": self._rows, "_codes": self._codes,
+                "_scales": self._scales, "_raw": self._raw}
+
+    def _append(self, **values):
+        """Append aligned column values, growing every column geometrically"""
+        count = len(values["_ids"])
+        needed = self._size + count
+        for name, new in values.items():
+            column = getattr(self, name)
+            if new is None:
+                setattr(self, name, None)
+                continue
+            if column is None or column.shape[1:] != new.shape[1:] or column.dtype != new.dtype:
+                column = np.zeros((0,) + new.shape[1:], dtype=new.dtype)
+            if needed > len(column):
+                grown = np.zeros((max(needed, 2 * len(column), 64),) + new.shape[1:], dtype=new.dtype)
+                grown[:self._size] = column[:self._size]
+                column = grown
+            column[self._size:needed] = new
+            setattr(self, name, column)
+        self._size = needed
+
+    def add(self, ids: List[int], vectors: np.ndarray, rows: Optional[np.ndarray] = None,
+            partitions: Optional[List[str]] = None):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        vectors = normalize_vectors(vectors)
+        rows = np.full(len(ids), -1, dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64)
+        self._partitions.add(ids.tolist(), partitions)
+
+        if not self.codec.trained:
+            self._append(_ids=ids, _rows=rows, _raw=vectors)
+            if self._size >= self.train_size:
+                self.train()
+            return
+
+        codes, scales = self.codec.encode(vectors)
+        self._append(_ids=ids, _rows=rows, _codes=codes, _scales=scales)
+
+    def train(self):
+        """Train the codec on the buffered float32 vectors and quantize them"""
+        raw = self._raw[:self._size]
+        self.codec.train(raw)
+        codes, scales = self.codec.encode(raw)
+        self._codes, self._scales, self._raw = codes, scales, None
+        self._ids, self._rows = self._ids[:self._size].copy(), self._rows[:self._size].copy()
+        logger.info(f"Trained {self.codec.name} quantizer on {self._size} vectors")
+
+    def _score(self, queries: np.ndarray, positions: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate (queries, candidates) scores for all live positions or the given ones"""
+        count = self._size if positions is None else len(positions)
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK):
+            block = slice(start, min(start + SCORE_BLOCK, count))
+            index = block if positions is None else positions[block]
+            if self._raw is not None:
+                scores[:, block] = queries @ self._raw[index].T
+            else:
+                scales = None if self._scales is None else self._scales[index]
+                scores[:, block] = self.codec.score(queries, self._codes[index], scales)
+        return scores
+
+    def search(self, query: np.ndarray, k: int,
+               partitions: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_batch(query[np.newaxis, :], k, partitions)[0]
+
+    def search_batch(self, queries: np.ndarray, k: int,
+                     partitions: Optional[Iterable[str]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if k <= 0 or self._size == 0:
+            return _empty_results(len(queries))
+        queries = np.asarray(queries, dtype=np.float32)
+
+        positions = None
+        if partitions is not None:
+            allowed = np.fromiter(self._partitions.allowed(partitions), dtype=np.int64)
+            positions = np.flatnonzero(np.isin(self._ids[:self._size], allowed))
+            if len(positions) == 0:
+                return _empty_results(len(queries))
+        candidates = self._size if positions is None else len(positions)
+
+        rescoring = self.rescore > 0 and self.store is not None and self._raw is None
+        shortlist = min(candidates, k * self.rescore if rescoring else k)
+        scores = self._score(queries, positions)
+        top = top_k_rows(scores, shortlist)
+        top_positions = top if positions is None else positions[top]
+
+        if not rescoring:
+            return list(zip(self._ids[top_positions], np.take_along_axis(scores, top, axis=1)))
+
+        results = []
+        for query, candidate_positions in zip(queries, top_positions):
+            rows = self._rows[candidate_positions]
+            if (rows < 0).any():
+                exact = self._score(query[np.newaxis, :], candidate_positions)[0]
+            else:
+                exact = self.store.get(rows) @ query
+            best = top_k_rows(exact[np.newaxis, :], min(k, len(exact)))[0]
+            results.append((self._ids[candidate_positions[best]], exact[best]))
+        return results
+
+    def remove(self, ids: List[int]):
+        keep = ~np.isin(self._ids[:self._size], np.asarray(ids, dtype=np.int64))
+        kept = int(keep.sum())
+        if kept == self._size:
+            return
+        for name, column in self._columns().items():
+            if column is not None:
+                setattr(self, name, column[:self._size][keep].copy())
+        self._size = kept
+        self._partitions.remove(list(ids))
+
+    def assign_partitions(self, ids: List[int], partitions: List[str]):
+        self._partitions.add(ids, partitions)
+
+    def get_ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def memory_bytes(self) -> int:
+        """Bytes held by codes, scales and ids (what a deployment has to keep resident)"""
+        return sum(column[:self._size].nbytes for column in self._columns().values() if column is not None)
+
+    def save(self, path: str):
+        arrays = {name.lstrip("_"): column[:self._size] for name, column in self._columns().items()
+                  if column is not None}
+        arrays.update(self.codec.state())
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, signature=self.codec.signature, **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            if str(data["signature"]) != self.codec.signature:
+                logger.info("Quantized index on disk uses different settings, rebuilding")
+                return False
+            self.reset()
+            self.codec.load_state({name: data[name] for name in data.files})
+            self._ids, self._rows = data["ids"], data["rows"]
+            for name in ("codes", "scales", "raw"):
+                setattr(self, "_" + name, data[name] if name in data.files else None)
+            self._size = len(self._ids)
+        return True
@@ -2,39 +2,330 @@
 RAG (Retrieval-Augmented Generation) System for LMU-specific context
 """
 
+import base64
+import fnmatch
+import glob
+import gzip
+import hashlib
 import json
 import os
+import re
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 import sqlite3
-from .utils import logger, clean_text
+from .utils import logger, clean_text, load_config, compute_content_hash
+from .vector_index import create_index, index_path_for, normalize_vectors
+from .cache import LRUCache, SemanticCache
+from .embeddings import OnnxEmbeddingModel, load_embedding_model, onnx_backend_available, compare_embeddings
+from .embedding_store import EmbeddingStore, store_path_for
+from .chunking import chunker_for_model, merge_chunks
+from .reranker import CrossEncoderReranker
+from .context_packer import pack_context, estimate_tokens
+
+# Header tag of export_snapshot() files
+SNAPSHOT_FORMAT = "campus-llm-knowledge-snapshot"
+SNAPSHOT_VERSION = 1
+
+# sentence_transformers imports torch (several seconds), so it is resolved on first model load
+SentenceTransformer = None
+
+def _sentence_transformer_class():
+    """Import SentenceTransformer on demand"""
+    global SentenceTransformer
+    if SentenceTransformer is None:
+        from sentence_transformers import SentenceTransformer as model_class
+        SentenceTransformer = model_class
+    return SentenceTransformer
+
+# Words that carry no topic; ORed as prefixes they would match nearly every chunk
+_STOPWORDS = frozenset("""
+    a about above after again all also am an and any are as at be because been before being below between
+    both but by can could did do does doing down during each few for from further get got had has have
+    having he her here hers him his how i if im in into is it its just know let like me more most my no
+    nor not now of off on once only or other our out over own please same she should so some such tell
+    than thanks that the their them then there these they this those through to too under until up very
+    want was we were what whats when where which while who whom why will with would you your
+""".split())
+
+def _fts_match_expression(query: str, match_any: bool = False) -> str:
+    """Turn free text into an FTS5 query matching each word as a prefix
+    
+    By default every word must match; `match_any` ORs the content words instead,
+    dropping stopwords and words under three letters, which would otherwise
+    prefix-match nearly every chunk.
+    """
+    terms = re.findall(r"\w+", query.lower())
+    if match_any:
+        return " OR ".join(f'"{term}"*' for term in terms if len(term) > 2 and term not in _STOPWORDS)
+    return " ".join(f'"{term}"*' for term in terms)
+
+def _partition_key(category: Optional[str]) -> str:
+    """Vector index partition label for a chunk category"""
+    return (category or "").casefold()
+
+def _parse_knowledge_items(data: Any) -> List[Dict[str, Any]]:
+    """Extract knowledge items from the JSON layouts accepted by update_knowledge_from_file"""
+    items = []
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict) and "content" in item:
+                items.append({
+                    "content": item["content"],
+                    "source": item.get("source", ""),
+                    "category": item.get("category", "General")
+                })
+    elif isinstance(data, dict):
+        for category, category_items in data.items():
+            if isinstance(category_items, list):
+                for item in category_items:
+                    if isinstance(item, dict) and "content" in item:
+                        items.append({
+                            "content": item["content"],
+                            "source": item.get("source", ""),
+                            "category": category
+                        })
+                    elif isinstance(item, str):
+                        items.append({"content": item, "source": "", "category": category})
+    return items
+
+def _item_hash(item: Dict[str, Any]) -> str:
+    """Manifest key of a knowledge file item: its cleaned content plus metadata"""
+    return compute_content_hash(json.dumps(
+        [clean_text(item["content"]), item.get("source", ""), item.get("category", "General")]
+    ))
 
 class RAGSystem:
-    def __init__(self):
-        """Initialize the RAG system"""
-        self.embedding_model = None
-        self.knowledge_base = []
-        self.embeddings = []
-        self.db_path = "data/rag_knowledge.db"
+    def __init__(self, db_path: str = "data/rag_knowledge.db"):
+        """Initialize the RAG system
+        
+        Nothing heavy happens here: the embedding model, the knowledge base and the
+        vector index are loaded on first use, or up front via warmup().
+        """
+        self.model_name = "all-MiniLM-L6-v2"
+        self.db_path = db_path
+        self.config = load_config()["rag"]
+        
+        # Normalized query embeddings keyed on the cleaned, case-folded query
+        self.query_cache = LRUCache(
+            max_size=self.config.get("query_cache_size", 1024),
+            ttl=self.config.get("query_cache_ttl", 3600)
+        )
+        
+        # Retrieval results keyed on the knowledge generation they were computed against;
+        # every knowledge change bumps the generation, so stale hits are impossible
+        self.result_cache = LRUCache(
+            max_size=self.config.get("result_cache_size", 512),
+            ttl=self.config.get("result_cache_ttl", 600)
+        )
+        self._generation = 0
+        self._generation_lock = threading.Lock()
+        
+        # Final answers keyed on question embeddings, so paraphrases skip generation
+        answer_config = self.config.get("answer_cache") or {}
+        self.answer_cache = SemanticCache(
+            max_size=answer_config.get("max_size", 256),
+            ttl=answer_config.get("ttl", 3600),
+            threshold=answer_config.get("threshold", 0.92)
+        )
+        
+        # Embeddings live in a shared memory-mapped file; SQLite keeps text and metadata
+        self.embedding_store = EmbeddingStore(store_path_for(self.db_path))
         
-        # Initialize embedding model
-        self._load_embedding_model()
+        # Vector index over chunk embeddings plus chunk metadata keyed by id
+        self.index = create_index(self.config.get("index"), store=self.embedding_store)
+        self.index_path = index_path_for(self.db_path, self.index)
+        self._chunks_by_id = {}
+        self._chunk_positions = {}
+        self._index_lock = threading.Lock()
         
-        # Load or create knowledge base
-        self._initialize_knowledge_base()
+        # Per-stage seconds of the most recent retrieve() call
+        self.last_timings = {}
+        
+        # Lazily loaded state
+        self._embedding_model = None
+        self._knowledge_base = []
+        self._model_loaded = False
+        self._knowledge_loaded = False
+        self._knowledge_loading = False
+        self._index_loaded = False
+        self._fts_available = False
+        self._chunker = None
+        self._reranker = None
+        self._seed_defaults = True
+        self._load_lock = threading.RLock()
+
+    @property
+    def embedding_model(self):
+        """The embedding model, loaded on first access"""
+        if not self._model_loaded:
+            with self._load_lock:
+                if not self._model_loaded:
+                    self._load_embedding_model()
+                    self._model_loaded = True
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, model):
+        self._embedding_model = model
+        self._model_loaded = True
+        self._chunker = None
+
+    @property
+    def knowledge_base(self) -> List[Dict[str, Any]]:
+        """Chunk metadata, loaded from the database on first access"""
+        self._ensure_knowledge_loaded()
+        return self._knowledge_base
+
+    @knowledge_base.setter
+    def knowledge_base(self, items: List[Dict[str, Any]]):
+        self._knowledge_base = items
+        self._knowledge_loaded = True
+        self._bump_generation()
+
+    @property
+    def generation(self) -> int:
+        """Monotonic counter bumped whenever chunks are added, recategorized or removed"""
+        return self._generation
+
+    def _bump_generation(self):
+        """Invalidate cached retrieval results and answers after the knowledge base changed"""
+        with self._generation_lock:
+            self._generation += 1
+        self.result_cache.clear()
+        self.answer_cache.clear()
+
+    def _ensure_knowledge_loaded(self):
+        """Create the schema and load chunk metadata if that has not happened yet"""
+        if not self._knowledge_loaded:
+            with self._load_lock:
+                # Seeding the default knowledge re-enters on the loading thread (the lock is
+                # reentrant); other threads wait here until loading has finished
+                if not self._knowledge_loaded and not self._knowledge_loading:
+                    self._knowledge_loading = True
+                    try:
+                        self._initialize_knowledge_base()
+                        self._knowledge_loaded = True
+                    finally:
+                        self._knowledge_loading = False
+
+    def _ensure_index_loaded(self):
+        """Build the vector index from stored embeddings if that has not happened yet"""
+        self._ensure_knowledge_loaded()
+        if not self._index_loaded:
+            with self._load_lock:
+                if not self._index_loaded:
+                    self._load_index()
+                    self._index_loaded = True
+
+    def warmup(self) -> Dict[str, float]:
+        """Load the model, knowledge base and vector index now; returns seconds spent on each"""
+        timings = {}
+        
+        start = time.perf_counter()
+        model = self.embedding_model
+        if model is not None:
+            model.encode(["warmup"])
+        timings["model"] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        self._ensure_knowledge_loaded()
+        timings["knowledge_base"] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        self._ensure_index_loaded()
+        timings["index"] = time.perf_counter() - start
+        
+        reranker = self._get_reranker()
+        if reranker is not None:
+            start = time.perf_counter()
+            if reranker.model is not None:
+                reranker.model.predict([("warmup", "warmup")])
+            timings["reranker"] = time.perf_counter() - start
+        
+        logger.info(
+            "RAG warmup finished: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+        )
+        return timings
 
     def _load_embedding_model(self):
-        """Load the sentence transformer model for embeddings"""
+        """Load the embedding model with the configured backend (rag.embedding_backend)"""
         try:
             # Use a lightweight model that works well for semantic search
-            model_name = "all-MiniLM-L6-v2"
-            logger.info(f"Loading embedding model: {model_name}")
-            self.embedding_model = SentenceTransformer(model_name)
+            backend = self.config.get("embedding_backend", "sentence-transformers")
+            logger.info(f"Loading embedding model: {self.model_name} ({backend})")
+            self._embedding_model = load_embedding_model(
+                self.model_name,
+                backend,
+                sentence_transformer_loader=_sentence_transformer_class,
+                **self._backend_options(backend)
+            )
             logger.info("Embedding model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading embedding model: {e}")
-            self.embedding_model = None
+            self._embedding_model = None
+
+    def _backend_options(self, backend: str) -> Dict[str, Any]:
+        """Constructor options for non-default embedding backends"""
+        if backend != "onnx":
+            return {}
+        return {
+            "quantize": self.config.get("onnx_quantize", True),
+            "cache_dir": self.config.get("model_cache_dir", "data/models"),
+            "num_threads": self.config.get("onnx_threads")
+        }
+
+    def _embedding_backend_label(self) -> str:
+        """Backend the embedding model runs on, including ONNX weight quantization (their vectors differ)
+        
+        Taken from the loaded model, since an unavailable ONNX backend falls back to
+        sentence-transformers; before the model is loaded, the backend it would load with.
+        """
+        if self._model_loaded and self._embedding_model is not None:
+            if isinstance(self._embedding_model, OnnxEmbeddingModel):
+                return "onnx-int8" if self._embedding_model.quantize else "onnx"
+            return "sentence-transformers"
+        if self.config.get("embedding_backend", "sentence-transformers") == "onnx" and onnx_backend_available():
+            return "onnx-int8" if self.config.get("onnx_quantize", True) else "onnx"
+        return "sentence-transformers"
+
+    def check_embedding_parity(self, sample_size: int = 32) -> Dict[str, Any]:
+        """Re-encode stored chunks and compare against their stored embeddings
+        
+        Useful after switching rag.embedding_backend: the knowledge base was usually
+        embedded with PyTorch, so a low min_cosine means it should be re-embedded.
+        """
+        try:
+            self._ensure_knowledge_loaded()
+            if not self.embedding_model:
+                return {}
+            
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT content, embedding_row FROM knowledge_chunks WHERE embedding_row IS NOT NULL "
+                    "ORDER BY RANDOM() LIMIT ?",
+                    (sample_size,)
+                )
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                return {}
+            
+            stored = self.embedding_store.get([row for _, row in rows])
+            fresh = np.asarray(self.embedding_model.encode([content for content, _ in rows]), dtype=np.float32)
+            report = compare_embeddings(stored, fresh)
+            report["backend"] = self.config.get("embedding_backend", "sentence-transformers")
+            logger.info(f"Embedding parity: {report}")
+            return report
+            
+        except Exception as e:
+            logger.error(f"Error checking embedding parity: {e}")
+            return {}
 
     def _initialize_knowledge_base(self):
         """Initialize the knowledge base database"""
@@ -50,11 +341,50 @@ class RAGSystem:
                     source TEXT,
                     category TEXT,
                     embedding BLOB,
+                    content_hash TEXT,
+                    embedding_row INTEGER,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             
+            # Source documents; each chunk records its document and position in it
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT,
+                    category TEXT,
+                    content_hash TEXT UNIQUE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Change manifest for incrementally indexed knowledge files
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS knowledge_files (
+                    file_path TEXT PRIMARY KEY,
+                    mtime REAL,
+                    content_hash TEXT,
+                    indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS knowledge_file_items (
+                    file_path TEXT NOT NULL,
+                    item_hash TEXT NOT NULL,
+                    chunk_ids TEXT NOT NULL,
+                    PRIMARY KEY (file_path, item_hash)
+                )
+            """)
+            
+            self._migrate_content_hashes(conn)
+            self._migrate_document_columns(conn)
+            moved = self._migrate_embeddings_to_store(conn)
+            self._fts_available = self._ensure_full_text_index(conn)
+            
             conn.commit()
+            if moved:
+                # Reclaim the space the embedding BLOBs used
+                conn.execute("VACUUM")
             conn.close()
             
             # Load existing knowledge base
@@ -63,34 +393,257 @@ class RAGSystem:
         except Exception as e:
             logger.error(f"Error initializing knowledge base: {e}")
 
+    def _migrate_content_hashes(self, conn: sqlite3.Connection):
+        """Add and backfill the content_hash column, then enforce uniqueness when possible"""
+        cursor = conn.cursor()
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(knowledge_chunks)")]
+        if "content_hash" not in columns:
+            cursor.execute("ALTER TABLE knowledge_chunks ADD COLUMN content_hash TEXT")
+        
+        cursor.execute("SELECT id, content FROM knowledge_chunks WHERE content_hash IS NULL")
+        missing = cursor.fetchall()
+        if missing:
+            cursor.executemany(
+                "UPDATE knowledge_chunks SET content_hash = ? WHERE id = ?",
+                [(compute_content_hash(content), chunk_id) for chunk_id, content in missing]
+            )
+            logger.info(f"Backfilled content hashes for {len(missing)} knowledge chunks")
+        
+        self._ensure_unique_hash_index(conn)
+
+    def _migrate_document_columns(self, conn: sqlite3.Connection):
+        """Add the parent document columns (NULL for chunks stored before chunking existed)"""
+        cursor = conn.cursor()
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(knowledge_chunks)")]
+        if "document_id" not in columns:
+            cursor.execute("ALTER TABLE knowledge_chunks ADD COLUMN document_id INTEGER")
+        if "chunk_index" not in columns:
+            cursor.execute("ALTER TABLE knowledge_chunks ADD COLUMN chunk_index INTEGER")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_knowledge_chunks_document
+            ON knowledge_chunks (document_id, chunk_index)
+        """)
+
+    def _migrate_embeddings_to_store(self, conn: sqlite3.Connection) -> int:
+        """Move legacy embedding BLOBs into the memory-mapped store"""
+        cursor = conn.cursor()
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(knowledge_chunks)")]
+        if "embedding_row" not in columns:
+            cursor.execute("ALTER TABLE knowledge_chunks ADD COLUMN embedding_row INTEGER")
+        
+        cursor.execute("""
+            SELECT id, embedding FROM knowledge_chunks
+            WHERE embedding IS NOT NULL AND embedding_row IS NULL
+            ORDER BY id
+        """)
+        legacy = cursor.fetchall()
+        if not legacy:
+            return 0
+        
+        vectors = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in legacy])
+        rows = self.embedding_store.append(vectors)
+        cursor.executemany(
+            "UPDATE knowledge_chunks SET embedding_row = ?, embedding = NULL WHERE id = ?",
+            [(int(row), chunk_id) for (chunk_id, _), row in zip(legacy, rows)]
+        )
+        logger.info(f"Moved {len(legacy)} embeddings into {self.embedding_store.path}")
+        return len(legacy)
+
+    def _ensure_full_text_index(self, conn: sqlite3.Connection) -> bool:
+        """Create the FTS5 keyword index (kept in sync by triggers) and the category index"""
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_knowledge_chunks_category
+            ON knowledge_chunks (category COLLATE NOCASE)
+        """)
+        
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_fts'"
+        ).fetchone()
+        try:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5(
+                    content, category,
+                    content='knowledge_chunks', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 unavailable ({e}), keyword search falls back to a scan")
+            return False
+        
+        conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_insert AFTER INSERT ON knowledge_chunks BEGIN
+                INSERT INTO knowledge_fts (rowid, content, category)
+                VALUES (new.id, new.content, new.category);
+            END;
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_delete AFTER DELETE ON knowledge_chunks BEGIN
+                INSERT INTO knowledge_fts (knowledge_fts, rowid, content, category)
+                VALUES ('delete', old.id, old.content, old.category);
+            END;
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_update AFTER UPDATE OF content, category ON knowledge_chunks BEGIN
+                INSERT INTO knowledge_fts (knowledge_fts, rowid, content, category)
+                VALUES ('delete', old.id, old.content, old.category);
+                INSERT INTO knowledge_fts (rowid, content, category)
+                VALUES (new.id, new.content, new.category);
+            END;
+        """)
+        
+        if not exists:
+            # Index the chunks written before the FTS table existed
+            conn.execute("INSERT INTO knowledge_fts (knowledge_fts) VALUES ('rebuild')")
+            logger.info("Built the knowledge_fts keyword index")
+        return True
+
+    def _ensure_unique_hash_index(self, conn: sqlite3.Connection) -> bool:
+        """Create the unique content_hash index, which fails while duplicates remain"""
+        try:
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_knowledge_chunks_content_hash
+                ON knowledge_chunks (content_hash)
+            """)
+            return True
+        except sqlite3.IntegrityError:
+            logger.warning(
+                "knowledge_chunks contains duplicate content; run "
+                "`python scripts/setup_knowledge_base.py --compact` to remove them"
+            )
+            return False
+
+    def compact_knowledge(self) -> int:
+        """Remove duplicate chunks (keeping the oldest copy), enforce unique content and reclaim dead embeddings
+        
+        Returns the number of duplicate chunks removed.
+        """
+        try:
+            self._ensure_knowledge_loaded()
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    DELETE FROM knowledge_chunks
+                    WHERE id NOT IN (
+                        SELECT MIN(id) FROM knowledge_chunks GROUP BY content_hash
+                    )
+                """)
+                removed = cursor.rowcount
+                self._ensure_unique_hash_index(conn)
+                conn.commit()
+                reclaimed = self._compact_embedding_store(conn)
+                if removed or reclaimed:
+                    conn.execute("VACUUM")
+            finally:
+                conn.close()
+            
+            if removed or reclaimed:
+                self._reload()
+            
+            logger.info(f"Compaction removed {removed} duplicate knowledge chunks and reclaimed {reclaimed} embedding rows")
+            return removed
+            
+        except Exception as e:
+            logger.error(f"Error compacting knowledge base: {e}")
+            return 0
+
+    def _compact_embedding_store(self, conn: sqlite3.Connection) -> int:
+        """Rewrite the embedding store without rows no chunk references, returning the rows reclaimed
+        
+        Deleted, replaced and rolled-back chunks leave their rows behind in the
+        append-only store, where exact search still scores them.
+        """
+        live = conn.execute(
+            "SELECT id, embedding_row FROM knowledge_chunks WHERE embedding_row IS NOT NULL ORDER BY embedding_row"
+        ).fetchall()
+        if len(live) == len(self.embedding_store):
+            return 0
+        
+        def renumber():
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("UPDATE knowledge_chunks SET embedding_row = ? WHERE id = ?",
+                                 [(row, chunk_id) for row, (chunk_id, _) in enumerate(live)])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        # Searches must not score the old row numbers against the new file
+        with self._index_lock:
+            reclaimed = self.embedding_store.compact([row for _, row in live], before_replace=renumber)
+            self.index.reset()
+            # A persisted index may reference store rows; rebuild it from the renumbered store
+            if self.index_path and os.path.exists(self.index_path):
+                os.remove(self.index_path)
+        return reclaimed
+
+    def _reload(self):
+        """Re-read chunk metadata, and the vector index if it was already loaded"""
+        with self._load_lock:
+            self._knowledge_loaded = True
+            self._load_knowledge_base()
+            if self._index_loaded:
+                self._load_index()
+        self._bump_generation()
+
     def _load_knowledge_base(self):
-        """Load knowledge base from database"""
+        """Load knowledge base metadata from database"""
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            cursor.execute("SELECT content, source, category FROM knowledge_chunks")
+            cursor.execute("""
+                SELECT id, content, source, category, document_id, chunk_index
+                FROM knowledge_chunks ORDER BY id
+            """)
             results = cursor.fetchall()
             
-            self.knowledge_base = []
-            for result in results:
-                self.knowledge_base.append({
-                    "content": result[0],
-                    "source": result[1],
-                    "category": result[2]
-                })
+            knowledge_base = []
+            chunks_by_id = {}
+            chunk_positions = {}
+            for chunk_id, content, source, category, document_id, chunk_index in results:
+                item = {
+                    "id": chunk_id,
+                    "content": content,
+                    "source": source,
+                    "category": category,
+                    "document_id": document_id,
+                    "chunk_index": chunk_index
+                }
+                knowledge_base.append(item)
+                chunks_by_id[chunk_id] = item
+                if document_id is not None:
+                    chunk_positions[(document_id, chunk_index)] = chunk_id
             
             conn.close()
             
-            logger.info(f"Loaded {len(self.knowledge_base)} knowledge chunks")
+            self._knowledge_base = knowledge_base
+            self._chunks_by_id = chunks_by_id
+            self._chunk_positions = chunk_positions
+            
+            logger.info(f"Loaded {len(self._knowledge_base)} knowledge chunks")
             
             # If no knowledge base exists, create default one
-            if len(self.knowledge_base) == 0:
+            if len(self._knowledge_base) == 0 and self._seed_defaults:
                 self._create_default_knowledge_base()
                 
         except Exception as e:
             logger.error(f"Error loading knowledge base: {e}")
 
+    def _load_index(self):
+        """Read stored embeddings and build the vector index from them"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id, embedding_row FROM knowledge_chunks WHERE embedding_row IS NOT NULL ORDER BY id")
+                embedding_rows = dict(cursor.fetchall())
+            finally:
+                conn.close()
+            
+            self._build_index(embedding_rows)
+            
+        except Exception as e:
+            logger.error(f"Error loading vector index: {e}")
+
     def _create_default_knowledge_base(self):
         """Create a default knowledge base with basic LMU information and Gen Z culture"""
         default_knowledge = [
@@ -217,130 +770,798 @@ class RAGSystem:
         ]
         
         # Add default knowledge to database
-        for item in default_knowledge:
-            self.add_knowledge(item["content"], item["source"], item["category"])
+        self.add_knowledge_batch(default_knowledge)
         
         logger.info("Created default knowledge base")
 
     def add_knowledge(self, content: str, source: str = "", category: str = "General") -> bool:
-        """Add new knowledge to the database"""
+        """Add a document to the knowledge base, split per rag.chunk_size / rag.chunk_overlap
+        
+        Chunks whose content is already stored are not re-embedded; only their metadata is updated.
+        """
         try:
+            self._ensure_knowledge_loaded()
             if not self.embedding_model:
                 logger.warning("Embedding model not available, skipping knowledge addition")
                 return False
             
-            content = clean_text(content)
-            if not content:
+            if not clean_text(content):
                 return False
             
-            # Generate embedding
-            embedding = self.embedding_model.encode([content])[0]
-            embedding_blob = embedding.tobytes()
-            
-            # Store in database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO knowledge_chunks (content, source, category, embedding)
-                VALUES (?, ?, ?, ?)
-            """, (content, source, category, embedding_blob))
-            
-            conn.commit()
-            conn.close()
-            
-            # Add to in-memory knowledge base
-            self.knowledge_base.append({
-                "content": content,
-                "source": source,
-                "category": category
-            })
-            
-            logger.info(f"Added knowledge chunk: {content[:100]}...")
+            added, _ = self._ingest([{"content": content, "source": source, "category": category}])
+            if added:
+                logger.info(f"Added {added} knowledge chunk(s): {clean_text(content)[:100]}...")
+            else:
+                logger.info(f"Knowledge already stored: {clean_text(content)[:100]}...")
             return True
             
         except Exception as e:
             logger.error(f"Error adding knowledge: {e}")
             return False
 
-    def get_relevant_context(self, query: str, max_results: int = 3) -> str:
-        """Get relevant context for a query using semantic search"""
+    def add_knowledge_batch(self, items: Iterable[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+        """Add many documents with batched encoding and a single transaction
+        
+        Each item is a dict with "content" and optional "source"/"category". Documents are
+        chunked lazily as batches fill, so `items` may be a generator. Content that is
+        already stored is not re-encoded; only its metadata is updated. Returns the number
+        of new chunks added; per-batch throughput is logged.
+        """
         try:
-            if not self.embedding_model or len(self.knowledge_base) == 0:
-                return ""
-            
-            query = clean_text(query)
-            if not query:
-                return ""
+            self._ensure_knowledge_loaded()
+            if not self.embedding_model:
+                logger.warning("Embedding model not available, skipping knowledge addition")
+                return 0
             
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode([query])[0]
+            total_start = time.perf_counter()
+            added, seen = self._ingest(items, batch_size)
             
-            # Get all embeddings from database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            elapsed = time.perf_counter() - total_start
+            logger.info(
+                f"Added {added} knowledge chunks ({seen - added} already stored) in {elapsed:.2f}s "
+                f"({added / max(elapsed, 1e-9):.1f} chunks/s)"
+            )
+            return added
             
-            cursor.execute("SELECT content, source, category, embedding FROM knowledge_chunks")
-            results = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error adding knowledge batch: {e}")
+            return 0
+
+    def _ingest(self, items: Iterable[Dict[str, Any]], batch_size: Optional[int] = None,
+                inserted: Optional[set] = None) -> tuple:
+        """Chunk, embed and store documents in one transaction; returns (chunks added, chunks seen)"""
+        return self._ingest_rows(lambda conn: self._iter_chunk_rows(conn, items), self._encode_chunks, batch_size,
+                                 inserted)
+
+    def _encode_chunks(self, rows: List[tuple], batch_size: int) -> np.ndarray:
+        """Embed the content of new chunk rows with the embedding model"""
+        return np.asarray(self.embedding_model.encode([row[0] for row in rows], batch_size=batch_size), dtype=np.float32)
+
+    def _ingest_rows(self, make_rows, embed, batch_size: Optional[int] = None, inserted: Optional[set] = None) -> tuple:
+        """Store chunk rows in one transaction; returns (chunks added, chunks seen)
+        
+        `make_rows(conn)` yields (content, source, category, document_id, chunk_index);
+        `embed(new_rows, batch_size)` returns the embeddings of rows not stored yet.
+        If given, `inserted` receives the ids of the newly stored chunks.
+        """
+        batch_size = batch_size or self.config.get("batch_size", 64)
+        seen = 0
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            pending = []
+            all_updates = []
+            chunk_rows = make_rows(conn)
+            batches = iter(lambda: list(islice(chunk_rows, batch_size)), [])
+            for batch_number, rows in enumerate(batches, start=1):
+                seen += len(rows)
+                batch_start = time.perf_counter()
+                batch, updates = self._upsert_existing(conn, rows)
+                all_updates.extend(updates)
+                if not batch:
+                    continue
+                
+                embeddings = embed(batch, batch_size)
+                encoded_at = time.perf_counter()
+                chunk_ids, store_rows = self._insert_chunks(conn, batch, embeddings)
+                pending.append((chunk_ids, batch, embeddings, store_rows))
+                
+                elapsed = time.perf_counter() - batch_start
+                logger.info(
+                    f"Batch {batch_number}: {len(batch)} chunks in {elapsed:.2f}s "
+                    f"(encode {encoded_at - batch_start:.2f}s, "
+                    f"{len(batch) / max(elapsed, 1e-9):.1f} chunks/s)"
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
             conn.close()
+        
+        # Only publish to memory once the transaction has committed
+        added = 0
+        self._apply_metadata_updates(all_updates)
+        for chunk_ids, batch, embeddings, store_rows in pending:
+            self._register_chunks(chunk_ids, batch, embeddings, store_rows)
+            added += len(chunk_ids)
+            if inserted is not None:
+                inserted.update(chunk_ids)
+        if added:
+            self.save_index()
+        return added, seen
+
+    def _iter_chunk_rows(self, conn: sqlite3.Connection, items: Iterable[Dict[str, Any]]) -> Iterator[tuple]:
+        """Lazily yield (content, source, category, document_id, chunk_index) for each chunk of each item"""
+        chunker = self._get_chunker()
+        for item in items:
+            content = item.get("content", "")
+            if not clean_text(content):
+                continue
+            source = item.get("source", "")
+            category = item.get("category", "General")
+            document_id = self._register_document(conn, content, source, category)
+            for chunk_index, chunk in enumerate(chunker.chunks(content)):
+                chunk = clean_text(chunk)
+                if chunk:
+                    yield (chunk, source, category, document_id, chunk_index)
+
+    def _register_document(self, conn: sqlite3.Connection, content: str, source: str, category: str) -> int:
+        """Return the id of the document with this content, inserting it if it is new"""
+        return self._register_document_hash(conn, compute_content_hash(clean_text(content)), source, category)
+
+    def _register_document_hash(self, conn: sqlite3.Connection, content_hash: str, source: str, category: str) -> int:
+        """Return the id of the document with this content hash, inserting it if it is new"""
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO documents (source, category, content_hash) VALUES (?, ?, ?)",
+            (source, category, content_hash)
+        )
+        if cursor.rowcount:
+            return cursor.lastrowid
+        return conn.execute("SELECT id FROM documents WHERE content_hash = ?", (content_hash,)).fetchone()[0]
+
+    def _get_chunker(self):
+        """Chunker sized by rag.chunk_size / rag.chunk_overlap and clamped to the model window"""
+        if self._chunker is None:
+            self._chunker = chunker_for_model(
+                self.embedding_model,
+                self.config.get("chunk_size", 1000),
+                self.config.get("chunk_overlap", 200)
+            )
+        return self._chunker
+
+    def _upsert_existing(self, conn: sqlite3.Connection, rows: List[tuple]) -> tuple:
+        """Split rows into new (hashed) rows and metadata updates for content already stored
+        
+        Rows are (content, source, category, document_id, chunk_index). Returns (new_rows,
+        updates) where new_rows are (content, source, category, hash, document_id, chunk_index)
+        and updates are (source, category, chunk_id) that have been written to `conn`.
+        """
+        hashes = [compute_content_hash(row[0]) for row in rows]
+        cursor = conn.cursor()
+        existing = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique_hashes), 500):
+            chunk = unique_hashes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(
+                f"SELECT content_hash, id, source, category FROM knowledge_chunks "
+                f"WHERE content_hash IN ({placeholders}) ORDER BY id",
+                chunk
+            )
+            for content_hash, chunk_id, source, category in cursor.fetchall():
+                existing.setdefault(content_hash, (chunk_id, source, category))
+        
+        new_rows, updates, seen = [], [], set()
+        for (content, source, category, document_id, chunk_index), content_hash in zip(rows, hashes):
+            if content_hash in seen:
+                continue
+            seen.add(content_hash)
+            if content_hash in existing:
+                chunk_id, old_source, old_category = existing[content_hash]
+                if (source, category) != (old_source, old_category):
+                    updates.append((source, category, chunk_id))
+            else:
+                new_rows.append((content, source, category, content_hash, document_id, chunk_index))
+        
+        if updates:
+            cursor.executemany("UPDATE knowledge_chunks SET source = ?, category = ? WHERE id = ?", updates)
+        return new_rows, updates
+
+    def _apply_metadata_updates(self, updates: List[tuple]):
+        """Mirror committed source/category updates into the in-memory knowledge base"""
+        recategorized = False
+        if updates:
+            self._bump_generation()
+        for source, category, chunk_id in updates:
+            item = self._chunks_by_id.get(chunk_id)
+            if item is not None:
+                recategorized = recategorized or _partition_key(item["category"]) != _partition_key(category)
+                item["source"] = source
+                item["category"] = category
+        
+        # Vector index partitions follow categories, so move recategorized chunks
+        if recategorized and self._index_loaded:
+            self._load_index()
+
+    def _insert_chunks(self, conn: sqlite3.Connection, rows: List[tuple], embeddings: np.ndarray) -> tuple:
+        """Store embeddings and insert (content, source, category, hash, document_id, chunk_index) rows
+        
+        Returns (chunk_ids, store_rows). Store rows written for a transaction that is
+        later rolled back are simply never referenced.
+        """
+        store_rows = self.embedding_store.append(embeddings)
+        cursor = conn.cursor()
+        if len(rows) == 1:
+            cursor.execute("""
+                INSERT INTO knowledge_chunks
+                    (content, source, category, content_hash, document_id, chunk_index, embedding_row)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (*rows[0], int(store_rows[0])))
+            return [cursor.lastrowid], store_rows
+        
+        # Ids are allocated sequentially while we hold the write lock
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM knowledge_chunks")
+        last_id = cursor.fetchone()[0]
+        cursor.executemany("""
+            INSERT INTO knowledge_chunks
+                (content, source, category, content_hash, document_id, chunk_index, embedding_row)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(*row, int(store_row)) for row, store_row in zip(rows, store_rows)])
+        cursor.execute("SELECT id FROM knowledge_chunks WHERE id > ? ORDER BY id", (last_id,))
+        return [row[0] for row in cursor.fetchall()], store_rows
+
+    def _register_chunks(self, chunk_ids: List[int], rows: List[tuple], embeddings: np.ndarray,
+                         store_rows: np.ndarray):
+        """Publish stored chunks to the in-memory knowledge base and vector index"""
+        for chunk_id, (content, source, category, _, document_id, chunk_index) in zip(chunk_ids, rows):
+            item = {
+                "id": chunk_id,
+                "content": content,
+                "source": source,
+                "category": category,
+                "document_id": document_id,
+                "chunk_index": chunk_index
+            }
+            self._knowledge_base.append(item)
+            self._chunks_by_id[chunk_id] = item
+            if document_id is not None:
+                self._chunk_positions[(document_id, chunk_index)] = chunk_id
+        
+        # An index that is not loaded yet picks these up from SQLite when it is
+        if self._index_loaded:
+            partitions = [_partition_key(row[2]) for row in rows]
+            with self._index_lock:
+                self.index.add(chunk_ids, embeddings, rows=store_rows, partitions=partitions)
+        self._bump_generation()
+
+    def _build_index(self, embedding_rows: Dict[int, int]):
+        """Bring the vector index in sync with the stored embeddings (chunk id -> store row)
+        
+        A persisted ANN index is reused when it only lacks recently added chunks;
+        it is rebuilt from scratch if it references chunks that no longer exist.
+        """
+        with self._index_lock:
+            self.index.reset()
+            if self.index_path and self.index.load(self.index_path):
+                indexed = set(self.index.get_ids().tolist())
+                if indexed - set(embedding_rows):
+                    logger.info("Persisted vector index is stale, rebuilding")
+                    self.index.reset()
+                    indexed = set()
+                else:
+                    self.index.assign_partitions(list(indexed), [self._chunk_partition(chunk_id) for chunk_id in indexed])
+            else:
+                indexed = set()
             
-            if not results:
-                return ""
+            missing = [chunk_id for chunk_id in embedding_rows if chunk_id not in indexed]
+            if missing:
+                rows = np.array([embedding_rows[chunk_id] for chunk_id in missing], dtype=np.int64)
+                vectors = None if self.index.uses_store else self.embedding_store.get(rows)
+                partitions = [self._chunk_partition(chunk_id) for chunk_id in missing]
+                self.index.add(missing, vectors, rows=rows, partitions=partitions)
             
-            # Calculate similarities
-            similarities = []
-            for i, (content, source, category, embedding_blob) in enumerate(results):
-                try:
-                    embedding = np.frombuffer(embedding_blob, dtype=np.float32)
-                    similarity = np.dot(query_embedding, embedding) / (
-                        np.linalg.norm(query_embedding) * np.linalg.norm(embedding)
+            logger.info(f"Vector index ({self.index.kind}) holds {len(self.index)} embeddings")
+        
+        if missing:
+            self.save_index()
+
+    def _chunk_partition(self, chunk_id: int) -> str:
+        """Partition label of a loaded chunk"""
+        item = self._chunks_by_id.get(chunk_id)
+        return _partition_key(item["category"] if item else None)
+
+    def save_index(self) -> bool:
+        """Persist the vector index next to the knowledge database (ANN indexes only)"""
+        if not self.index_path or not self._index_loaded:
+            return False
+        try:
+            with self._index_lock:
+                self.index.save(self.index_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving vector index: {e}")
+            return False
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Return normalized embeddings for cleaned queries, encoding every cache miss in one call"""
+        keys = [query.casefold() for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        
+        misses = {}
+        for query, key, embedding in zip(queries, keys, embeddings):
+            if embedding is None and key not in misses:
+                misses[key] = query
+        if misses:
+            encoded = normalize_vectors(self.embedding_model.encode(list(misses.values())))
+            for key, embedding in zip(misses, encoded):
+                embedding.flags.writeable = False
+                self.query_cache.put(key, embedding)
+                misses[key] = embedding
+            embeddings = [misses[key] if embedding is None else embedding
+                          for key, embedding in zip(keys, embeddings)]
+        
+        return np.stack(embeddings)
+
+    def _search_vectors(self, query_vectors: np.ndarray, k: int,
+                        categories: Optional[List[str]] = None) -> List[List[tuple]]:
+        """Return (score, chunk) pairs for the k nearest chunks of each query row, scoring only the given categories"""
+        partitions = None if categories is None else {_partition_key(category) for category in categories}
+        with self._index_lock:
+            batch = self.index.search_batch(query_vectors, k, partitions=partitions)
+        
+        return [
+            [
+                (float(score), self._chunks_by_id[chunk_id])
+                for chunk_id, score in zip(ids.tolist(), scores.tolist())
+                if chunk_id in self._chunks_by_id
+            ]
+            for ids, scores in batch
+        ]
+
+    def _fuse(self, vector_hits: List[tuple], keyword_hits: List[tuple], hybrid: Dict[str, Any]) -> List[tuple]:
+        """Combine (score, chunk) lists from both retrievers into one (score, chunk) ranking
+        
+        "rrf" sums 1 / (rrf_k + rank) over the lists a chunk appears in; "weighted" mixes
+        cosine similarity with BM25 scaled by the best keyword score.
+        """
+        fused = {}
+        chunks = {}
+        
+        if hybrid.get("method", "rrf") == "weighted":
+            vector_weight = hybrid.get("vector_weight", 0.7)
+            keyword_weight = hybrid.get("keyword_weight", 0.3)
+            best_keyword = max((score for score, _ in keyword_hits), default=0.0)
+            for score, item in vector_hits:
+                fused[item["id"]] = fused.get(item["id"], 0.0) + vector_weight * score
+                chunks[item["id"]] = item
+            for score, item in keyword_hits:
+                scaled = score / best_keyword if best_keyword > 0 else 0.0
+                fused[item["id"]] = fused.get(item["id"], 0.0) + keyword_weight * scaled
+                chunks[item["id"]] = item
+        else:
+            rrf_k = hybrid.get("rrf_k", 60)
+            for hits in (vector_hits, keyword_hits):
+                for rank, (_, item) in enumerate(hits):
+                    fused[item["id"]] = fused.get(item["id"], 0.0) + 1.0 / (rrf_k + rank + 1)
+                    chunks[item["id"]] = item
+        
+        return sorted(((score, chunks[chunk_id]) for chunk_id, score in fused.items()),
+                      key=lambda pair: pair[0], reverse=True)
+
+    def retrieve(self, query: str, max_results: int = 3, hybrid: Optional[bool] = None,
+                 categories: Optional[List[str]] = None) -> List[tuple]:
+        """Return up to max_results (score, chunk) pairs for a query, best first
+        
+        Vector hits must clear rag.similarity_threshold. With rag.hybrid enabled (or
+        `hybrid=True`) BM25 keyword hits are fused in, so exact-token queries like
+        "PROWL" still find their chunk. `categories` restricts both stages to those
+        categories (only their index partitions are scored). Per-stage seconds land
+        in last_timings.
+        """
+        return self.retrieve_batch([query], max_results, hybrid, categories)[0]
+
+    def retrieve_batch(self, queries: List[str], max_results: int = 3, hybrid: Optional[bool] = None,
+                       categories: Optional[List[str]] = None) -> List[List[tuple]]:
+        """Run retrieve() for several queries, embedding them in one call and scoring them in one matrix product
+        
+        Returns one (score, chunk) list per query, in order; empty queries get [].
+        Results are served from result_cache while the knowledge generation is unchanged.
+        """
+        timings = {}
+        total_start = time.perf_counter()
+        self.last_timings = timings
+        results = [[] for _ in queries]
+        
+        self._ensure_index_loaded()
+        if not self.embedding_model or len(self.index) == 0:
+            return results
+        
+        cleaned = [(position, clean_text(query)) for position, query in enumerate(queries)]
+        cleaned = [(position, query) for position, query in cleaned if query]
+        if not cleaned:
+            return results
+        
+        hybrid_config = self.config.get("hybrid") or {}
+        use_hybrid = hybrid_config.get("enabled", False) if hybrid is None else hybrid
+        use_hybrid = use_hybrid and self._fts_available
+        threshold = self.config.get("similarity_threshold", 0.3)
+        
+        # Everything that shapes the result is part of the key, so config tweaks never serve stale hits
+        generation = self._generation
+        settings = (
+            max_results,
+            threshold,
+            None if categories is None else tuple(sorted({_partition_key(category) for category in categories})),
+            tuple(sorted(hybrid_config.items())) if use_hybrid else None,
+            self._rerank_settings()
+        )
+        keys = {position: (generation, query.casefold(), settings) for position, query in cleaned}
+        
+        pending = []
+        for position, query in cleaned:
+            cached = self.result_cache.get(keys[position])
+            if cached is None:
+                pending.append((position, query))
+            else:
+                results[position] = list(cached)
+        
+        if pending:
+            found = self._retrieve_uncached([query for _, query in pending], max_results, threshold,
+                                            hybrid_config if use_hybrid else None, categories, timings)
+            for (position, _), hits in zip(pending, found):
+                results[position] = hits
+                self.result_cache.put(keys[position], tuple(hits))
+        
+        timings["total"] = time.perf_counter() - total_start
+        logger.debug(
+            f"Retrieval timings ({len(pending)}/{len(cleaned)} queries uncached): "
+            + ", ".join(f"{stage} {1000 * seconds:.2f}ms" for stage, seconds in timings.items())
+        )
+        return results
+
+    def _retrieve_uncached(self, queries: List[str], max_results: int, threshold: float,
+                           hybrid_config: Optional[Dict[str, Any]], categories: Optional[List[str]],
+                           timings: Dict[str, float]) -> List[List[tuple]]:
+        """Run the embed, vector, keyword, fusion and rerank stages for cleaned queries (hybrid_config None = vector only)"""
+        reranker = self._get_reranker()
+        keep = max(max_results, self.config.get("rerank", {}).get("candidates", 10)) if reranker else max_results
+        candidates = max(keep, hybrid_config.get("candidates", 20)) if hybrid_config is not None else keep
+        
+        start = time.perf_counter()
+        query_embeddings = self._encode_queries(queries)
+        timings["embed"] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        vector_hits = [
+            [(score, item) for score, item in hits if score > threshold]
+            for hits in self._search_vectors(query_embeddings, candidates, categories)
+        ]
+        timings["vector"] = time.perf_counter() - start
+        
+        if hybrid_config is None:
+            return self._rerank(queries, [hits[:keep] for hits in vector_hits], reranker, max_results, timings)
+        
+        start = time.perf_counter()
+        keyword_hits = [
+            [
+                (score, self._chunks_by_id[chunk_id])
+                for chunk_id, _, _, _, score in self._keyword_search(query, categories, candidates, match_any=True)
+                if chunk_id in self._chunks_by_id
+            ]
+            for query in queries
+        ]
+        keyword_hits = [
+            self._filter_keyword_hits(query_embedding, vector, keyword, hybrid_config)
+            for query_embedding, vector, keyword in zip(query_embeddings, vector_hits, keyword_hits)
+        ]
+        timings["keyword"] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        results = [
+            self._fuse(vector, keyword, hybrid_config)[:keep]
+            for vector, keyword in zip(vector_hits, keyword_hits)
+        ]
+        timings["fusion"] = time.perf_counter() - start
+        return self._rerank(queries, results, reranker, max_results, timings)
+
+    def _filter_keyword_hits(self, query_embedding: np.ndarray, vector_hits: List[tuple], keyword_hits: List[tuple],
+                             hybrid: Dict[str, Any]) -> List[tuple]:
+        """Drop keyword-only hits too weak to stand on their own
+        
+        A chunk the vector stage did not return is kept only if its BM25 score clears
+        hybrid.min_keyword_score and its cosine similarity clears the looser
+        hybrid.keyword_min_similarity, so an incidental word match on an off-topic
+        question cannot pull in unrelated context.
+        """
+        vector_ids = {item["id"] for _, item in vector_hits}
+        min_score = hybrid.get("min_keyword_score", 2.0)
+        keyword_only = [item["id"] for score, item in keyword_hits if item["id"] not in vector_ids and score >= min_score]
+        similarities = {}
+        if keyword_only:
+            embeddings = self._chunk_embeddings(keyword_only)
+            if embeddings is not None:
+                similarities = dict(zip(keyword_only, (embeddings @ query_embedding).tolist()))
+        
+        min_similarity = hybrid.get("keyword_min_similarity", 0.15)
+        return [
+            (score, item) for score, item in keyword_hits
+            if item["id"] in vector_ids or similarities.get(item["id"], -1.0) >= min_similarity
+        ]
+
+    def _get_reranker(self) -> Optional[CrossEncoderReranker]:
+        """The cross-encoder reranker when rag.rerank is enabled, created on first use"""
+        rerank_config = self.config.get("rerank") or {}
+        if not rerank_config.get("enabled", False):
+            return None
+        if self._reranker is None:
+            with self._load_lock:
+                if self._reranker is None:
+                    self._reranker = CrossEncoderReranker(
+                        rerank_config.get("model", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+                        budget_ms=rerank_config.get("budget_ms", 150),
+                        batch_size=rerank_config.get("batch_size", 8),
+                        max_length=rerank_config.get("max_length", 256)
                     )
-                    similarities.append((similarity, content, source, category))
-                except Exception as e:
-                    logger.warning(f"Error calculating similarity for chunk {i}: {e}")
-                    continue
+        self._reranker.budget_ms = rerank_config.get("budget_ms", 150)
+        return self._reranker
+
+    def _rerank_settings(self) -> Optional[tuple]:
+        """Rerank configuration as a cache-key component (None when reranking is off)"""
+        rerank_config = self.config.get("rerank") or {}
+        return tuple(sorted(rerank_config.items())) if rerank_config.get("enabled", False) else None
+
+    def _rerank(self, queries: List[str], results: List[List[tuple]], reranker: Optional[CrossEncoderReranker],
+                max_results: int, timings: Dict[str, float]) -> List[List[tuple]]:
+        """Reorder each query's first-stage candidates with the cross-encoder and cut to max_results
+        
+        A query whose rerank misses rag.rerank.budget_ms keeps its first-stage order.
+        """
+        if reranker is None:
+            return [hits[:max_results] for hits in results]
+        
+        start = time.perf_counter()
+        reranked = []
+        for query, hits in zip(queries, results):
+            ordered = reranker.rerank(query, hits)
+            reranked.append((hits if ordered is None else ordered)[:max_results])
+        timings["rerank"] = time.perf_counter() - start
+        return reranked
+
+    def get_neighboring_chunks(self, chunk_id: int, window: int = 1) -> List[Dict[str, Any]]:
+        """Return a chunk and up to `window` chunks either side of it in its document, in order"""
+        self._ensure_knowledge_loaded()
+        item = self._chunks_by_id.get(chunk_id)
+        if item is None:
+            return []
+        if item.get("document_id") is None or window <= 0:
+            return [item]
+        
+        neighbors = []
+        for chunk_index in range(item["chunk_index"] - window, item["chunk_index"] + window + 1):
+            neighbor_id = self._chunk_positions.get((item["document_id"], chunk_index))
+            if neighbor_id is not None:
+                neighbors.append(self._chunks_by_id[neighbor_id])
+        return neighbors
+
+    def _format_context(self, results: List[tuple], neighbors: int, token_budget: int = 0) -> str:
+        """Format retrieved chunks, each widened by its neighbours, into a prompt context block
+        
+        A positive token_budget packs the blocks into that many (estimated) tokens
+        with context_packer.pack_context.
+        """
+        groups = []
+        included = set()
+        for score, item in results:
+            if item["id"] in included:
+                continue
+            group = [chunk for chunk in self.get_neighboring_chunks(item["id"], neighbors)
+                     if chunk["id"] not in included]
+            included.update(chunk["id"] for chunk in group)
+            groups.append((score, item, merge_chunks([chunk["content"] for chunk in group])))
+        
+        if token_budget and token_budget > 0 and groups:
+            packing = self.config.get("packing") or {}
+            packed = pack_context(
+                [content for _, _, content in groups],
+                [score for score, _, _ in groups],
+                token_budget,
+                embeddings=self._chunk_embeddings([item["id"] for _, item, _ in groups]),
+                overheads=[estimate_tokens(f"[{item['category']}] \nSource: {item['source'] or ''}\n")
+                           for _, item, _ in groups],
+                mmr_lambda=packing.get("mmr_lambda", 0.7),
+                max_redundancy=packing.get("max_redundancy", 0.9),
+                min_tokens=packing.get("min_chunk_tokens", 32)
+            )
+            groups = [(groups[index][0], groups[index][1], content) for index, content in packed]
+        
+        context_parts = []
+        for _, item, content in groups:
+            context_parts.append(f"[{item['category']}] {content}")
+            if item["source"]:
+                context_parts.append(f"Source: {item['source']}")
+            context_parts.append("")  # Add spacing
+        
+        return "\n".join(context_parts)
+
+    def _chunk_embeddings(self, chunk_ids: List[int]) -> Optional[np.ndarray]:
+        """Stored embeddings of the given chunks in order, or None if any is missing"""
+        try:
+            placeholders = ",".join("?" * len(chunk_ids))
+            conn = sqlite3.connect(self.db_path)
+            try:
+                rows = dict(conn.execute(
+                    f"SELECT id, embedding_row FROM knowledge_chunks WHERE id IN ({placeholders})", chunk_ids
+                ).fetchall())
+            finally:
+                conn.close()
+            if any(rows.get(chunk_id) is None for chunk_id in chunk_ids):
+                return None
+            return self.embedding_store.get([rows[chunk_id] for chunk_id in chunk_ids])
+        except Exception as e:
+            logger.error(f"Error reading chunk embeddings: {e}")
+            return None
+
+    def _context_token_budget(self, token_budget: Optional[int]) -> int:
+        """Resolve a per-call token budget against rag.packing.token_budget (0 = unlimited)"""
+        if token_budget is None:
+            token_budget = (self.config.get("packing") or {}).get("token_budget", 0)
+        return token_budget or 0
+
+    def get_relevant_context(self, query: str, max_results: int = 3, hybrid: Optional[bool] = None,
+                             categories: Optional[List[str]] = None, neighbors: Optional[int] = None,
+                             token_budget: Optional[int] = None) -> str:
+        """Get relevant context for a query using semantic (and optionally keyword) search
+        
+        `neighbors` (default rag.context_neighbors) widens each hit with that many
+        adjacent chunks of the same document on either side. The result is packed
+        into `token_budget` tokens (default rag.packing.token_budget, 0 = unlimited).
+        """
+        try:
+            if neighbors is None:
+                neighbors = self.config.get("context_neighbors", 0)
+            return self._format_context(self.retrieve(query, max_results, hybrid, categories), neighbors,
+                                        self._context_token_budget(token_budget))
             
-            # Sort by similarity and get top results
-            similarities.sort(key=lambda x: x[0], reverse=True)
-            top_results = similarities[:max_results]
+        except Exception as e:
+            logger.error(f"Error getting relevant context: {e}")
+            return ""
+
+    def get_relevant_context_batch(self, queries: List[str], max_results: int = 3, hybrid: Optional[bool] = None,
+                                   categories: Optional[List[str]] = None,
+                                   neighbors: Optional[int] = None,
+                                   token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get relevant context for several queries at once (e.g. sub-questions of one message)
+        
+        Each entry holds the query, its structured hits (chunk_id, score, category,
+        source, content) and the same formatted context get_relevant_context returns.
+        """
+        try:
+            if neighbors is None:
+                neighbors = self.config.get("context_neighbors", 0)
+            token_budget = self._context_token_budget(token_budget)
             
-            # Format context
-            context_parts = []
-            for similarity, content, source, category in top_results:
-                if similarity > 0.3:  # Threshold for relevance
-                    context_parts.append(f"[{category}] {content}")
-                    if source:
-                        context_parts.append(f"Source: {source}")
-                    context_parts.append("")  # Add spacing
+            batch = []
+            for query, results in zip(queries, self.retrieve_batch(queries, max_results, hybrid, categories)):
+                batch.append({
+                    "query": query,
+                    "results": [
+                        {
+                            "chunk_id": item["id"],
+                            "score": score,
+                            "category": item["category"],
+                            "source": item["source"],
+                            "content": item["content"],
+                        }
+                        for score, item in results
+                    ],
+                    "context": self._format_context(results, neighbors, token_budget),
+                })
+            return batch
             
-            return "\n".join(context_parts)
+        except Exception as e:
+            logger.error(f"Error getting batched context: {e}")
+            return [{"query": query, "results": [], "context": ""} for query in queries]
+
+    def lookup_answer(self, question: str) -> Optional[str]:
+        """Return a cached answer to a question close enough to this one (rag.answer_cache)"""
+        try:
+            if not (self.config.get("answer_cache") or {}).get("enabled", False):
+                return None
+            question = clean_text(question)
+            if not question or not self.embedding_model:
+                return None
+            return self.answer_cache.get(self._encode_queries([question])[0], self._generation)
             
         except Exception as e:
-            logger.error(f"Error getting relevant context: {e}")
-            return ""
+            logger.error(f"Error looking up cached answer: {e}")
+            return None
 
-    def search_knowledge(self, query: str, category: str = None) -> List[Dict[str, Any]]:
-        """Search knowledge base with optional category filter"""
+    def store_answer(self, question: str, answer: str, generation: Optional[int] = None) -> bool:
+        """Cache a generated answer
+        
+        Pass the `generation` read before retrieving context, so an answer built on
+        knowledge that changed mid-generation is never served.
+        """
         try:
-            results = []
-            query_lower = query.lower()
+            if not (self.config.get("answer_cache") or {}).get("enabled", False):
+                return False
+            question = clean_text(question)
+            if not question or not answer or not self.embedding_model:
+                return False
+            generation = self._generation if generation is None else generation
+            self.answer_cache.put(self._encode_queries([question])[0], answer, generation)
+            return True
             
-            for item in self.knowledge_base:
-                # Category filter
-                if category and item["category"].lower() != category.lower():
-                    continue
-                
-                # Simple text search (can be enhanced with semantic search)
-                if (query_lower in item["content"].lower() or 
-                    query_lower in item["category"].lower()):
-                    results.append(item)
+        except Exception as e:
+            logger.error(f"Error caching answer: {e}")
+            return False
+
+    def search_knowledge(self, query: str, category: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Keyword search ranked by BM25, with prefix matching and an optional category filter"""
+        try:
+            self._ensure_knowledge_loaded()
+            if not self._fts_available:
+                return self._scan_knowledge(query, category)[:limit]
             
-            return results
+            return [
+                {"id": chunk_id, "content": content, "source": source, "category": category_name, "score": score}
+                for chunk_id, content, source, category_name, score
+                in self._keyword_search(query, [category] if category else None, limit)
+            ]
             
         except Exception as e:
             logger.error(f"Error searching knowledge: {e}")
             return []
 
+    def _keyword_search(self, query: str, categories: Optional[List[str]], limit: int,
+                        match_any: bool = False) -> List[tuple]:
+        """Run an FTS5 query, returning (id, content, source, category, score) rows best first"""
+        match = _fts_match_expression(query, match_any)
+        if not match:
+            return []
+        
+        sql = """
+            SELECT c.id, c.content, c.source, c.category, bm25(knowledge_fts) AS rank
+            FROM knowledge_fts JOIN knowledge_chunks c ON c.id = knowledge_fts.rowid
+            WHERE knowledge_fts MATCH ?
+        """
+        params = [match]
+        if categories is not None:
+            if not categories:
+                return []
+            sql += f" AND c.category COLLATE NOCASE IN ({', '.join('?' * len(categories))})"
+            params.extend(categories)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        
+        # bm25() is lower-is-better; expose a higher-is-better score
+        return [(chunk_id, content, source, category_name, -rank)
+                for chunk_id, content, source, category_name, rank in rows]
+
+    def _scan_knowledge(self, query: str, category: str = None) -> List[Dict[str, Any]]:
+        """Substring search over the in-memory metadata, used when SQLite lacks FTS5"""
+        results = []
+        query_lower = query.lower()
+        
+        for item in self.knowledge_base:
+            # Category filter
+            if category and item["category"].lower() != category.lower():
+                continue
+            
+            if (query_lower in item["content"].lower() or
+                query_lower in item["category"].lower()):
+                results.append(item)
+        
+        return results
+
     def get_categories(self) -> List[str]:
         """Get all available categories"""
         try:
@@ -352,53 +1573,258 @@ class RAGSystem:
             logger.error(f"Error getting categories: {e}")
             return []
 
-    def update_knowledge_from_file(self, file_path: str) -> int:
-        """Update knowledge base from a JSON file"""
+    def update_knowledge_from_file(self, file_path: str, force: bool = False) -> int:
+        """Incrementally index a JSON knowledge file, returning the number of new chunks
+        
+        Only items that were added or changed since the last run are embedded, and
+        chunks of items that disappeared are deleted (see refresh_knowledge_file).
+        """
+        return self.refresh_knowledge_file(file_path, force).get("chunks_added", 0)
+
+    def refresh_knowledge_file(self, file_path: str, force: bool = False) -> Dict[str, Any]:
+        """Bring the knowledge base in line with one JSON file using the change manifest
+        
+        The manifest records each file's mtime and content hash and, per item, the
+        chunk ids it owns: those its ingest inserted or another manifest item already owns,
+        never chunks stored by other sources (the default seed, add_knowledge_batch). A file whose hash is unchanged is skipped without parsing; otherwise
+        new or changed items are ingested and chunks of removed items are deleted
+        (unless another manifest item still uses them). Returns a summary dict.
+        """
+        summary = {"file": file_path, "skipped": False, "items_added": 0, "items_removed": 0,
+                   "items_unchanged": 0, "chunks_added": 0, "chunks_deleted": 0}
         try:
             if not os.path.exists(file_path):
                 logger.warning(f"Knowledge file not found: {file_path}")
-                return 0
+                return summary
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            self._ensure_knowledge_loaded()
+            manifest_path = os.path.normpath(file_path)
+            mtime = os.path.getmtime(file_path)
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            file_hash = hashlib.sha256(raw).hexdigest()
             
-            added_count = 0
+            conn = sqlite3.connect(self.db_path)
+            try:
+                known = conn.execute(
+                    "SELECT mtime, content_hash FROM knowledge_files WHERE file_path = ?", (manifest_path,)
+                ).fetchone()
+                # Only the content hash decides: copies made with `cp -p` / `rsync -t`, coarse
+                # timestamps or two writes within one tick can change a file but keep its mtime
+                if known and not force and known[1] == file_hash:
+                    if known[0] != mtime:
+                        # Touched but not modified: remember the new mtime and move on
+                        conn.execute("UPDATE knowledge_files SET mtime = ? WHERE file_path = ?", (mtime, manifest_path))
+                        conn.commit()
+                    summary["skipped"] = True
+                    return summary
+                previous = dict(conn.execute(
+                    "SELECT item_hash, chunk_ids FROM knowledge_file_items WHERE file_path = ?", (manifest_path,)
+                ).fetchall())
+            finally:
+                conn.close()
             
-            # Handle different JSON formats
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict) and "content" in item:
-                        success = self.add_knowledge(
-                            item["content"],
-                            item.get("source", ""),
-                            item.get("category", "General")
-                        )
-                        if success:
-                            added_count += 1
-            elif isinstance(data, dict):
-                for category, items in data.items():
-                    if isinstance(items, list):
-                        for item in items:
-                            if isinstance(item, dict) and "content" in item:
-                                success = self.add_knowledge(
-                                    item["content"],
-                                    item.get("source", ""),
-                                    category
-                                )
-                                if success:
-                                    added_count += 1
-                            elif isinstance(item, str):
-                                success = self.add_knowledge(item, "", category)
-                                if success:
-                                    added_count += 1
-            
-            logger.info(f"Added {added_count} knowledge items from {file_path}")
-            return added_count
+            items = {}
+            for item in _parse_knowledge_items(json.loads(raw.decode('utf-8'))):
+                items.setdefault(_item_hash(item), item)
+            
+            new_items = [item for item_hash, item in items.items() if item_hash not in previous]
+            removed = [item_hash for item_hash in previous if item_hash not in items]
+            summary["items_added"] = len(new_items)
+            summary["items_removed"] = len(removed)
+            summary["items_unchanged"] = len(items) - len(new_items)
+            
+            if new_items:
+                # Errors must propagate here: recording the manifest after a failed
+                # ingest would mark these items as indexed
+                if not self.embedding_model:
+                    raise RuntimeError("Embedding model not available")
+                inserted = set()
+                summary["chunks_added"], _ = self._ingest(new_items, inserted=inserted)
+            
+            # Chunk ids per item; unchanged items keep their recorded ids. A new item only
+            # claims chunks the manifest owns, so removing it never deletes a chunk that was
+            # stored by another source before it
+            entries = {item_hash: json.loads(previous[item_hash]) for item_hash in items if item_hash in previous}
+            if new_items:
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    owned = self._manifest_chunk_ids(conn) | inserted
+                finally:
+                    conn.close()
+                for item in new_items:
+                    entries[_item_hash(item)] = [
+                        chunk_id for chunk_id in self._chunk_ids_for(item["content"]) if chunk_id in owned
+                    ]
+            
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM knowledge_file_items WHERE file_path = ?", (manifest_path,))
+                conn.executemany(
+                    "INSERT INTO knowledge_file_items (file_path, item_hash, chunk_ids) VALUES (?, ?, ?)",
+                    [(manifest_path, item_hash, json.dumps(chunk_ids)) for item_hash, chunk_ids in entries.items()]
+                )
+                conn.execute("""
+                    INSERT OR REPLACE INTO knowledge_files (file_path, mtime, content_hash, indexed_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (manifest_path, mtime, file_hash))
+                conn.commit()
+                orphaned = self._orphaned_chunk_ids(
+                    conn, [chunk_id for item_hash in removed for chunk_id in json.loads(previous[item_hash])]
+                )
+            finally:
+                conn.close()
+            
+            if orphaned:
+                summary["chunks_deleted"] = self.delete_knowledge(orphaned)
+            
+            logger.info(
+                f"Refreshed {file_path}: {summary['items_added']} items added/changed, "
+                f"{summary['items_removed']} removed, {summary['items_unchanged']} unchanged "
+                f"({summary['chunks_added']} chunks embedded, {summary['chunks_deleted']} deleted)"
+            )
+            return summary
             
         except Exception as e:
             logger.error(f"Error updating knowledge from file: {e}")
+            return summary
+
+    def refresh_knowledge_directory(self, directory: str, pattern: str = "*.json") -> List[Dict[str, Any]]:
+        """Refresh every matching file in a directory and drop knowledge from files that were deleted"""
+        paths = sorted(glob.glob(os.path.join(directory, pattern)))
+        summaries = [self.refresh_knowledge_file(path) for path in paths]
+        
+        try:
+            self._ensure_knowledge_loaded()
+            current = {os.path.normpath(path) for path in paths}
+            prefix = os.path.normpath(directory) + os.sep
+            conn = sqlite3.connect(self.db_path)
+            try:
+                vanished = [
+                    file_path for (file_path,) in conn.execute("SELECT file_path FROM knowledge_files")
+                    if file_path.startswith(prefix) and file_path not in current
+                    and fnmatch.fnmatch(os.path.basename(file_path), pattern)
+                ]
+            finally:
+                conn.close()
+            for file_path in vanished:
+                summaries.append(self.forget_knowledge_file(file_path))
+        except Exception as e:
+            logger.error(f"Error refreshing knowledge directory: {e}")
+        
+        return summaries
+
+    def forget_knowledge_file(self, file_path: str) -> Dict[str, Any]:
+        """Delete the chunks a file contributed and its manifest entries"""
+        summary = {"file": file_path, "skipped": False, "items_added": 0, "items_removed": 0,
+                   "items_unchanged": 0, "chunks_added": 0, "chunks_deleted": 0}
+        self._ensure_knowledge_loaded()
+        manifest_path = os.path.normpath(file_path)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            chunk_ids = [
+                chunk_id
+                for (chunk_ids,) in conn.execute(
+                    "SELECT chunk_ids FROM knowledge_file_items WHERE file_path = ?", (manifest_path,)
+                )
+                for chunk_id in json.loads(chunk_ids)
+            ]
+            summary["items_removed"] = conn.execute(
+                "DELETE FROM knowledge_file_items WHERE file_path = ?", (manifest_path,)
+            ).rowcount
+            conn.execute("DELETE FROM knowledge_files WHERE file_path = ?", (manifest_path,))
+            conn.commit()
+            orphaned = self._orphaned_chunk_ids(conn, chunk_ids)
+        finally:
+            conn.close()
+        
+        if orphaned:
+            summary["chunks_deleted"] = self.delete_knowledge(orphaned)
+        logger.info(f"Removed knowledge from deleted file {file_path} ({summary['chunks_deleted']} chunks)")
+        return summary
+
+    def _chunk_ids_for(self, content: str) -> List[int]:
+        """Ids of the stored chunks a document's content splits into"""
+        hashes = list(dict.fromkeys(
+            compute_content_hash(clean_text(chunk)) for chunk in self._get_chunker().chunks(content)
+        ))
+        if not hashes:
+            return []
+        conn = sqlite3.connect(self.db_path)
+        try:
+            placeholders = ",".join("?" * len(hashes))
+            ids_by_hash = dict(conn.execute(
+                f"SELECT content_hash, id FROM knowledge_chunks WHERE content_hash IN ({placeholders})", hashes
+            ).fetchall())
+        finally:
+            conn.close()
+        return [ids_by_hash[content_hash] for content_hash in hashes if content_hash in ids_by_hash]
+
+    def _orphaned_chunk_ids(self, conn: sqlite3.Connection, chunk_ids: List[int]) -> List[int]:
+        """Filter chunk ids down to those no remaining manifest item references"""
+        if not chunk_ids:
+            return []
+        return sorted(set(chunk_ids) - self._manifest_chunk_ids(conn))
+
+    def _manifest_chunk_ids(self, conn: sqlite3.Connection) -> set:
+        """Ids of every chunk some manifest item references"""
+        referenced = set()
+        for (ids,) in conn.execute("SELECT chunk_ids FROM knowledge_file_items"):
+            referenced.update(json.loads(ids))
+        return referenced
+
+    def delete_knowledge(self, chunk_ids: Iterable[int]) -> int:
+        """Delete chunks from the database, the in-memory metadata and the vector index"""
+        try:
+            self._ensure_knowledge_loaded()
+            chunk_ids = sorted({int(chunk_id) for chunk_id in chunk_ids})
+            if not chunk_ids:
+                return 0
+            
+            deleted = 0
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for start in range(0, len(chunk_ids), 500):
+                    part = chunk_ids[start:start + 500]
+                    placeholders = ",".join("?" * len(part))
+                    deleted += conn.execute(f"DELETE FROM knowledge_chunks WHERE id IN ({placeholders})", part).rowcount
+                conn.execute("""
+                    DELETE FROM documents WHERE NOT EXISTS (
+                        SELECT 1 FROM knowledge_chunks WHERE knowledge_chunks.document_id = documents.id
+                    )
+                """)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            
+            self._forget_chunks(chunk_ids)
+            logger.info(f"Deleted {deleted} knowledge chunks")
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"Error deleting knowledge: {e}")
             return 0
 
+    def _forget_chunks(self, chunk_ids: List[int]):
+        """Drop deleted chunks from the in-memory metadata and the vector index"""
+        removed = set(chunk_ids)
+        self._knowledge_base = [item for item in self._knowledge_base if item["id"] not in removed]
+        for chunk_id in removed:
+            item = self._chunks_by_id.pop(chunk_id, None)
+            if item is not None and item.get("document_id") is not None:
+                self._chunk_positions.pop((item["document_id"], item["chunk_index"]), None)
+        
+        if self._index_loaded:
+            with self._index_lock:
+                self.index.remove(chunk_ids)
+            self.save_index()
+        self._bump_generation()
+
     def export_knowledge(self, file_path: str) -> bool:
         """Export knowledge base to JSON file"""
         try:
@@ -423,6 +1849,145 @@ class RAGSystem:
             logger.error(f"Error exporting knowledge: {e}")
             return False
 
+    def export_snapshot(self, file_path: str) -> int:
+        """Stream every chunk and its embedding to a JSONL snapshot (gzip-compressed for *.gz)
+        
+        The first line is a header naming the embedding model and dimension; each
+        following line is one chunk with its base64 float32 embedding. Chunks are read
+        from a SQLite cursor and written one at a time. Returns the number of chunks.
+        """
+        try:
+            self._ensure_knowledge_loaded()
+            vectors = self.embedding_store.matrix()
+            opener = gzip.open if file_path.endswith(".gz") else open
+            count = 0
+            
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.execute("""
+                    SELECT c.content, c.source, c.category, d.content_hash, c.chunk_index, c.embedding_row
+                    FROM knowledge_chunks c LEFT JOIN documents d ON d.id = c.document_id
+                    ORDER BY c.id
+                """)
+                tmp_path = file_path + ".tmp"
+                with opener(tmp_path, "wt", encoding="utf-8") as f:
+                    f.write(json.dumps({
+                        "format": SNAPSHOT_FORMAT,
+                        "version": SNAPSHOT_VERSION,
+                        "model": self.model_name,
+                        "backend": self._embedding_backend_label(),
+                        "dim": self.embedding_store.dim,
+                        "dtype": "<f4"
+                    }) + "\n")
+                    for content, source, category, document, chunk_index, row in cursor:
+                        embedding = None
+                        if row is not None and row < len(vectors):
+                            embedding = base64.b64encode(np.asarray(vectors[row], dtype="<f4").tobytes()).decode("ascii")
+                        f.write(json.dumps({
+                            "content": content,
+                            "source": source,
+                            "category": category,
+                            "document": document,
+                            "chunk_index": chunk_index,
+                            "embedding": embedding
+                        }, ensure_ascii=False) + "\n")
+                        count += 1
+                os.replace(tmp_path, file_path)
+            finally:
+                conn.close()
+            
+            logger.info(f"Exported {count} knowledge chunks with embeddings to {file_path}")
+            return count
+            
+        except Exception as e:
+            logger.error(f"Error exporting knowledge snapshot: {e}")
+            return 0
+
+    def import_snapshot(self, file_path: str, batch_size: Optional[int] = None, force: bool = False) -> Dict[str, Any]:
+        """Bulk-load a snapshot written by export_snapshot
+        
+        When the snapshot's model and dimension match this system, stored embeddings
+        are used as-is and the embedding model is never loaded; otherwise (or for
+        chunks exported without an embedding) the chunks are re-encoded. A snapshot
+        from another embedding backend is refused unless `force`, which re-encodes
+        it. Chunks already stored only get their metadata updated. Returns a summary dict.
+        """
+        summary = {"file": file_path, "chunks_added": 0, "chunks_seen": 0, "reencoded": False}
+        try:
+            opener = gzip.open if file_path.endswith(".gz") else open
+            with opener(file_path, "rt", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("format") != SNAPSHOT_FORMAT:
+                    raise ValueError(f"{file_path} is not a knowledge snapshot")
+                backend = self._embedding_backend_label()
+                backend_matches = header.get("backend") == backend
+                if not backend_matches and not force:
+                    raise ValueError(
+                        f"snapshot embeddings come from the {header.get('backend')} backend but "
+                        f"the embedding model runs on {backend}; import with force to re-encode"
+                    )
+                
+                # An empty database must not seed the default knowledge (that would load the model)
+                self._seed_defaults = False
+                try:
+                    self._ensure_knowledge_loaded()
+                finally:
+                    self._seed_defaults = True
+                
+                dim = header.get("dim")
+                reuse = backend_matches and header.get("model") == self.model_name and dim is not None and \
+                    self.embedding_store.dim in (None, dim)
+                if not reuse:
+                    logger.warning(
+                        f"Snapshot embeddings ({header.get('model')}, {header.get('backend')}, dim {dim}) do not "
+                        f"match {self.model_name} ({backend}); re-encoding"
+                    )
+                summary["reencoded"] = not reuse
+                
+                vectors = {}  # content hash -> snapshot embedding of rows in the current batch
+                
+                def rows(conn):
+                    for line in f:
+                        record = json.loads(line)
+                        content = clean_text(record.get("content", ""))
+                        if not content:
+                            continue
+                        source = record.get("source") or ""
+                        category = record.get("category") or "General"
+                        document_id = None
+                        if record.get("document"):
+                            document_id = self._register_document_hash(conn, record["document"], source, category)
+                        if reuse and record.get("embedding"):
+                            vectors[compute_content_hash(content)] = np.frombuffer(
+                                base64.b64decode(record["embedding"]), dtype="<f4"
+                            )
+                        yield (content, source, category, document_id, record.get("chunk_index"))
+                
+                def embed(new_rows, size):
+                    embeddings = [vectors.get(row[3]) for row in new_rows]
+                    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+                    if missing:
+                        encoded = self._encode_chunks([new_rows[i] for i in missing], size)
+                        for i, embedding in zip(missing, encoded):
+                            embeddings[i] = embedding
+                    vectors.clear()
+                    return np.vstack(embeddings).astype(np.float32)
+                
+                start = time.perf_counter()
+                added, seen = self._ingest_rows(rows, embed, batch_size)
+            
+            summary.update(chunks_added=added, chunks_seen=seen, seconds=time.perf_counter() - start)
+            logger.info(
+                f"Imported {added} knowledge chunks ({seen - added} already stored) from {file_path} "
+                f"in {summary['seconds']:.2f}s"
+            )
+            return summary
+            
+        except Exception as e:
+            logger.error(f"Error importing knowledge snapshot: {e}")
+            summary["error"] = str(e)
+            return summary
+
     def get_stats(self) -> Dict[str, Any]:
         """Get knowledge base statistics"""
         try:
@@ -436,7 +2001,15 @@ class RAGSystem:
             return {
                 "total_chunks": total_chunks,
                 "categories": categories,
-                "embedding_model": self.embedding_model.model_name if self.embedding_model else None
+                "vector_index": self.index.kind,
+                "indexed_vectors": len(self.index) if self._index_loaded else None,
+                "embedding_model": self.model_name if self._embedding_model is not None else None,
+                "query_cache": self.query_cache.stats(),
+                "result_cache": self.result_cache.stats(),
+                "answer_cache": self.answer_cache.stats(),
+                "rerank": self._reranker.stats() if self._reranker is not None else None,
+                "knowledge_generation": self._generation,
+                "last_retrieval_ms": {stage: 1000 * seconds for stage, seconds in self.last_timings.items()}
             }
             
         except Exception as e:
@@ -0,0 +1,111 @@
+"""
+Cross-encoder reranking for the RAG system's second retrieval stage
+
+A cross-encoder reads the query and a candidate chunk together, which ranks far
+better than bi-encoder cosine similarity but costs one transformer pass per pair.
+CrossEncoderReranker scores candidates in small batches against a per-query time
+budget; when the budget runs out it gives up and the caller keeps its first-stage
+ordering, so a slow CPU never stalls a chat turn.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+import numpy as np
+from .utils import logger
+
+# Like SentenceTransformer in rag_system, resolved on first use to keep torch out of startup
+CrossEncoder = None
+
+def _cross_encoder_class():
+    """Import CrossEncoder on demand"""
+    global CrossEncoder
+    if CrossEncoder is None:
+        from sentence_transformers import CrossEncoder as model_class
+        CrossEncoder = model_class
+    return CrossEncoder
+
+class CrossEncoderReranker:
+    """Bounded-latency reranking of (score, chunk) candidates with a lazily loaded cross-encoder"""
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", budget_ms: float = 150,
+                 batch_size: int = 8, max_length: int = 256, latency_window: int = 256):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self._model = None
+        self._load_failed = False
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self.calls = 0
+        self.fallbacks = 0
+
+    @property
+    def model(self):
+        """The cross-encoder, loaded on first access (None if loading failed)"""
+        if self._model is None and not self._load_failed:
+            with self._lock:
+                if self._model is None and not self._load_failed:
+                    try:
+                        logger.info(f"Loading cross-encoder: {self.model_name}")
+                        self._model = _cross_encoder_class()(self.model_name, max_length=self.max_length)
+                    except Exception as e:
+                        logger.error(f"Error loading cross-encoder, reranking disabled: {e}")
+                        self._load_failed = True
+        return self._model
+
+    def rerank(self, query: str, candidates: List[tuple]) -> Optional[List[tuple]]:
+        """Return candidates re-sorted by cross-encoder score, or None if the budget ran out
+
+        Scores of the returned pairs are cross-encoder relevance scores.
+        """
+        model = self.model
+        if model is None or len(candidates) < 2:
+            return None
+
+        pairs = [(query, item["content"]) for _, item in candidates]
+        deadline = self.budget_ms / 1000.0 if self.budget_ms and self.budget_ms > 0 else None
+        start = time.perf_counter()
+        scores = []
+        try:
+            for offset in range(0, len(pairs), self.batch_size):
+                # Stop between batches once over budget; a partial ranking is not worth using
+                if deadline is not None and time.perf_counter() - start > deadline:
+                    break
+                batch = pairs[offset:offset + self.batch_size]
+                scores.extend(np.asarray(model.predict(batch, batch_size=len(batch)), dtype=np.float32).ravel())
+        except Exception as e:
+            logger.error(f"Error reranking candidates: {e}")
+            scores = []
+
+        elapsed = time.perf_counter() - start
+        on_time = len(scores) == len(pairs) and (deadline is None or elapsed <= deadline)
+        with self._lock:
+            self.calls += 1
+            self._latencies.append(elapsed)
+            if not on_time:
+                self.fallbacks += 1
+        if not on_time:
+            logger.debug(f"Rerank of {len(pairs)} candidates exceeded {self.budget_ms}ms budget ({1000 * elapsed:.1f}ms)")
+            return None
+
+        order = np.argsort(-np.asarray(scores), kind="stable")
+        return [(float(scores[i]), candidates[i][1]) for i in order]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call/fallback counts and rerank latency percentiles in milliseconds"""
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            calls, fallbacks = self.calls, self.fallbacks
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "budget_ms": self.budget_ms,
+            "calls": calls,
+            "fallbacks": fallbacks,
+            "fallback_ratio": fallbacks / calls if calls else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) if latencies.size else None,
+            "p95_ms": float(np.percentile(latencies, 95)) if latencies.size else None
+        }
@@ -4,6 +4,7 @@ Utility functions for the LMU Campus LLM
 
 import json
 import os
+import hashlib
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional
@@ -30,13 +31,72 @@ def load_config(config_path: str = "config.json") -> Dict[str, Any]:
             "model": "llama3.2:3b",
             "temperature": 0.7,
             "max_tokens": 512,
-            "timeout": 30
+            "timeout": 30,
+            "connect_timeout": 3.05,
+            "pool_size": 10,
+            "connect_retries": 2,
+            "async_concurrency": 4,
+            "async_max_queue": 0,
+            "health_ttl": 30,
+            "breaker_failures": 3,
+            "breaker_cooldown": 30
         },
         "rag": {
             "chunk_size": 1000,
             "chunk_overlap": 200,
+            "context_neighbors": 0,
             "max_results": 5,
-            "similarity_threshold": 0.7
+            "similarity_threshold": 0.3,
+            "batch_size": 64,
+            "query_cache_size": 1024,
+            "query_cache_ttl": 3600,
+            "result_cache_size": 512,
+            "result_cache_ttl": 600,
+            "embedding_backend": "sentence-transformers",
+            "onnx_quantize": True,
+            "model_cache_dir": "data/models",
+            "index": {
+                "type": "brute_force",
+                "nlist": 256,
+                "nprobe": 8,
+                "hnsw_m": 16,
+                "hnsw_ef_construction": 200,
+                "hnsw_ef_search": 64,
+                "quantization": "int8",
+                "pq_m": 48,
+                "pq_bits": 8,
+                "rescore": 4
+            },
+            "hybrid": {
+                "enabled": True,
+                "method": "rrf",
+                "rrf_k": 60,
+                "vector_weight": 0.7,
+                "keyword_weight": 0.3,
+                "candidates": 20,
+                "min_keyword_score": 2.0,
+                "keyword_min_similarity": 0.15
+            },
+            "rerank": {
+                "enabled": False,
+                "model": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                "candidates": 10,
+                "budget_ms": 150,
+                "batch_size": 8,
+                "max_length": 256
+            },
+            "packing": {
+                "token_budget": 800,
+                "mmr_lambda": 0.7,
+                "max_redundancy": 0.9,
+                "min_chunk_tokens": 32
+            },
+            "answer_cache": {
+                "enabled": True,
+                "threshold": 0.92,
+                "ttl": 3600,
+                "max_size": 256
+            }
         },
         "points": {
             "question_asked": 1,
@@ -180,6 +240,10 @@ def clean_text(text: str) -> str:
     
     return text.strip()
 
+def compute_content_hash(text: str) -> str:
+    """Return a stable SHA-256 hex digest of already-cleaned text"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
 def format_points_display(user_stats: Dict[str, Any]) -> str:
     """Format user points for display"""
     total_points = user_stats.get('total_points', 0)
@@ -0,0 +1,682 @@
+"""
+Vector indexes for RAG retrieval
+
+All indexes store L2-normalized float32 vectors keyed by knowledge chunk id and
+score with inner product (= cosine similarity). BruteForceIndex is exact; IVFIndex
+and HNSWIndex trade a little recall for sub-linear query time on large corpora.
+
+Every vector may carry a partition label (the chunk category). Searches restricted
+to a set of partitions only score vectors in those partitions.
+"""
+
+import os
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .utils import logger
+
+try:
+    import hnswlib
+except ImportError:  # Optional dependency
+    hnswlib = None
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so cosine similarity becomes a dot product"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return positions of the k highest scores, best first"""
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(n)
+    return top[np.argsort(-scores[top], kind="stable")]
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise top_k over an (m, n) score matrix: (m, k) column positions, best first"""
+    m, n = scores.shape
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros((m, 0), dtype=np.int64)
+    if k < n:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(n), (m, n))
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+def _empty_results(count: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in range(count)]
+
+def merge_top_k(ids: List[np.ndarray], scores: List[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-partition (ids, scores) candidates into one best-first top k"""
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    ids = np.concatenate(ids)
+    scores = np.concatenate(scores)
+    top = top_k(scores, k)
+    return ids[top], scores[top]
+
+class PartitionMap:
+    """Partition label -> chunk ids, for indexes that filter inside one shared structure"""
+
+    def __init__(self):
+        self._ids = {}
+
+    def add(self, ids: Iterable[int], partitions: Optional[Iterable[str]]):
+        if partitions is None:
+            return
+        for chunk_id, label in zip(ids, partitions):
+            self._ids.setdefault(label, set()).add(int(chunk_id))
+
+    def remove(self, ids: Iterable[int]):
+        removed = {int(chunk_id) for chunk_id in ids}
+        for members in self._ids.values():
+            members -= removed
+
+    def allowed(self, partitions: Iterable[str]) -> set:
+        """Return every chunk id in the given partitions"""
+        allowed = set()
+        for label in partitions:
+            allowed |= self._ids.get(label, set())
+        return allowed
+
+class GrowableMatrix:
+    """Contiguous row buffer with parallel ids that grows by doubling"""
+
+    def __init__(self, dim: int = 0):
+        self.dim = dim
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.size = 0
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray):
+        """Append rows, reallocating geometrically when full"""
+        count, dim = vectors.shape
+        if self.size == 0 and self.dim != dim:
+            self.dim = dim
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+        elif self.dim != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {self.dim}")
+
+        needed = self.size + count
+        if needed > self.vectors.shape[0]:
+            capacity = max(needed, 2 * self.vectors.shape[0], 64)
+            grown = np.zeros((capacity, dim), dtype=np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            grown_ids = np.zeros(capacity, dtype=np.int64)
+            grown_ids[:self.size] = self.ids[:self.size]
+            self.vectors = grown
+            self.ids = grown_ids
+
+        self.vectors[self.size:needed] = vectors
+        self.ids[self.size:needed] = ids
+        self.size = needed
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the live (ids, vectors) without copying"""
+        return self.ids[:self.size], self.vectors[:self.size]
+
+    def remove(self, ids: np.ndarray) -> int:
+        """Drop rows with the given ids, compacting in place; returns how many were removed"""
+        live_ids, vectors = self.view()
+        keep = ~np.isin(live_ids, ids)
+        kept = int(keep.sum())
+        removed = self.size - kept
+        if removed:
+            self.vectors[:kept] = vectors[keep]
+            self.ids[:kept] = live_ids[keep]
+            self.size = kept
+        return removed
+
+class VectorIndex:
+    """Base class for chunk-id keyed vector indexes"""
+
+    kind = "base"
+    exact = False
+    uses_store = False
+
+    def add(self, ids: List[int], vectors: np.ndarray, rows: Optional[np.ndarray] = None,
+            partitions: Optional[List[str]] = None):
+        """Insert vectors under the given chunk ids (`rows` are embedding store rows,
+        `partitions` one label per id)"""
+        raise NotImplementedError
+
+    def search(self, query: np.ndarray, k: int,
+               partitions: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (chunk_ids, scores) of the k nearest vectors, best first
+
+        With `partitions`, only vectors carrying one of those labels are scored.
+        """
+        raise NotImplementedError
+
+    def search_batch(self, queries: np.ndarray, k: int,
+                     partitions: Optional[Iterable[str]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Search an (m, dim) block of queries, returning one (chunk_ids, scores) pair per query"""
+        return [self.search(query, k, partitions) for query in queries]
+
+    def remove(self, ids: List[int]):
+        """Remove the vectors stored under the given chunk ids"""
+        raise NotImplementedError
+
+    def assign_partitions(self, ids: List[int], partitions: List[str]):
+        """Record partition labels for vectors restored by load() (labels are not persisted)"""
+
+    def get_ids(self) -> np.ndarray:
+        """Return all chunk ids held by the index"""
+        raise NotImplementedError
+
+    def reset(self):
+        """Remove every vector from the index"""
+        raise NotImplementedError
+
+    def save(self, path: str):
+        """Persist the index to disk (no-op for indexes rebuilt from SQLite)"""
+
+    def load(self, path: str) -> bool:
+        """Load a persisted index, returning False when nothing usable was found"""
+        return False
+
+    def __len__(self) -> int:
+        return len(self.get_ids())
+
+class BruteForceIndex(VectorIndex):
+    """Exact index: one resident matrix per partition, scored with matrix products"""
+
+    kind = "brute_force"
+    exact = True
+
+    def __init__(self):
+        self.reset()
+
+    def add(self, ids: List[int], vectors: np.ndarray, rows: Optional[np.ndarray] = None,
+            partitions: Optional[List[str]] = None):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize_vectors(vectors)
+        labels = np.asarray(partitions if partitions is not None else [""] * len(ids), dtype=object)
+        for label in dict.fromkeys(labels.tolist()):
+            mask = labels == label
+            self._matrices.setdefault(label, GrowableMatrix()).append(ids[mask], vectors[mask])
+
+    def search(self, query: np.ndarray, k: int,
+               partitions: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_batch(query[np.newaxis, :], k, partitions)[0]
+
+    def search_batch(self, queries: np.ndarray, k: int,
+                     partitions: Optional[Iterable[str]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if k <= 0:
+            return _empty_results(len(queries))
+        labels = self._matrices.keys() if partitions is None else partitions
+        candidate_ids, candidate_scores = [], []
+        for label in labels:
+            matrix = self._matrices.get(label)
+            if matrix is not None and matrix.size:
+                ids, vectors = matrix.view()
+                scores = queries @ vectors.T
+                top = top_k_rows(scores, k)
+                candidate_ids.append(ids[top])
+                candidate_scores.append(np.take_along_axis(scores, top, axis=1))
+        if not candidate_ids:
+            return _empty_results(len(queries))
+
+        ids = np.concatenate(candidate_ids, axis=1)
+        scores = np.concatenate(candidate_scores, axis=1)
+        top = top_k_rows(scores, k)
+        ids = np.take_along_axis(ids, top, axis=1)
+        scores = np.take_along_axis(scores, top, axis=1)
+        return list(zip(ids, scores))
+
+    def remove(self, ids: List[int]):
+        ids = np.asarray(ids, dtype=np.int64)
+        for matrix in self._matrices.values():
+            matrix.remove(ids)
+
+    def get_ids(self) -> np.ndarray:
+        parts = [matrix.view()[0] for matrix in self._matrices.values()]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def reset(self):
+        self._matrices = {}
+
+    def __len__(self) -> int:
+        return sum(matrix.size for matrix in self._matrices.values())
+
+class MemmapBruteForceIndex(VectorIndex):
+    """Exact index that scores directly over a shared, memory-mapped EmbeddingStore
+
+    Only a row -> chunk id map is kept per process; rows that belong to deleted
+    chunks or to chunks this process has not loaded are masked out. Each partition
+    also keeps its row numbers, so filtered searches gather and score just those rows.
+    """
+
+    kind = "brute_force"
+    exact = True
+    uses_store = True
+
+    def __init__(self, store):
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        self._row_ids = np.full(0, -1, dtype=np.int64)
+        self._partition_rows = {}
+        self._count = 0
+
+    def add(self, ids: List[int], vectors: np.ndarray, rows: Optional[np.ndarray] = None,
+            partitions: Optional[List[str]] = None):
+        if rows is None:
+            raise ValueError("MemmapBruteForceIndex needs the embedding store rows of new vectors")
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+        needed = int(rows.max()) + 1
+        if needed > len(self._row_ids):
+            grown = np.full(max(needed, 2 * len(self._row_ids), 64), -1, dtype=np.int64)
+            grown[:len(self._row_ids)] = self._row_ids
+            self._row_ids = grown
+        self._count += int(np.count_nonzero(self._row_ids[rows] < 0))
+        self._row_ids[rows] = np.asarray(ids, dtype=np.int64)
+
+        labels = np.asarray(partitions if partitions is not None else [""] * len(rows), dtype=object)
+        for label in dict.fromkeys(labels.tolist()):
+            new_rows = rows[labels == label]
+            existing = self._partition_rows.get(label)
+            self._partition_rows[label] = new_rows if existing is None else np.concatenate([existing, new_rows])
+
+    def search(self, query: np.ndarray, k: int,
+               partitions: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_batch(query[np.newaxis, :], k, partitions)[0]
+
+    def search_batch(self, queries: np.ndarray, k: int,
+                     partitions: Optional[Iterable[str]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        matrix = self.store.matrix()
+        n = min(len(matrix), len(self._row_ids))
+        if n == 0 or k <= 0 or self._count == 0:
+            return _empty_results(len(queries))
+
+        if partitions is not None:
+            parts = [self._partition_rows[label] for label in partitions if label in self._partition_rows]
+            rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+            rows = np.sort(rows[rows < n])  # Ascending rows keep the gather sequential
+            if len(rows) == 0:
+                return _empty_results(len(queries))
+            row_ids = self._row_ids[rows]
+            scores = queries @ matrix[rows].T
+            live = len(rows)
+        else:
+            row_ids = self._row_ids[:n]
+            scores = np.asarray(queries @ matrix[:n].T)
+            if self._count < n:
+                scores[:, row_ids < 0] = -np.inf
+            live = self._count
+
+        top = top_k_rows(scores, min(k, live))
+        return list(zip(row_ids[top], np.take_along_axis(scores, top, axis=1)))
+
+    def remove(self, ids: List[int]):
+        dead = np.isin(self._row_ids, np.asarray(ids, dtype=np.int64)) & (self._row_ids >= 0)
+        if not dead.any():
+            return
+        self._row_ids[dead] = -1
+        self._count -= int(dead.sum())
+        for label, rows in self._partition_rows.items():
+            self._partition_rows[label] = rows[self._row_ids[rows] >= 0]
+
+    def get_ids(self) -> np.ndarray:
+        return self._row_ids[self._row_ids >= 0]
+
+    def __len__(self) -> int:
+        return self._count
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: spherical k-means cells, only `nprobe` cells scored per query
+
+    Until enough vectors exist to train `nlist` centroids the index scans its buffer
+    exactly, so small knowledge bases behave like BruteForceIndex.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, nlist: int = 256, nprobe: int = 8, min_points_per_list: int = 8,
+                 train_iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_points_per_list = min_points_per_list
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.reset()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def reset(self):
+        self.centroids = None
+        self.lists = []
+        self._untrained = GrowableMatrix()
+        self._partitions = PartitionMap()
+        self._count = 0
+
+    def add(self, ids: List[int], vectors: np.ndarray, rows: Optional[np.ndarray] = None,
+            partitions: Optional[List[str]] = None):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize_vectors(vectors)
+        self._partitions.add(ids.tolist(), partitions)
+        self._count += len(ids)
+
+        if not self.is_trained:
+            self._untrained.append(ids, vectors)
+            if self._untrained.size >= self.nlist * self.min_points_per_list:
+                self.train()
+            return
+
+        assignments = self._assign(vectors)
+        for cell in np.unique(assignments):
+            mask = assignments == cell
+            self.lists[cell].append(ids[mask], vectors[mask])
+
+    def _assign(self, vectors: np.ndarray, block: int = 8192) -> np.ndarray:
+        """Return the nearest centroid for each vector, in blocks to bound memory"""
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), block):
+            scores = vectors[start:start + block] @ self.centroids.T
+            assignments[start:start + block] = np.argmax(scores, axis=1)
+        return assignments
+
+    def train(self):
+        """Fit centroids on the buffered vectors and distribute them into cells"""
+        ids, vectors = self._untrained.view()
+        if len(ids) < self.nlist:
+            logger.warning(f"Not enough vectors to train IVF index ({len(ids)} < {self.nlist})")
+            return
+
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), self.nlist * 64)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.bincount(assignments, minlength=self.nlist) == 0
+            # Re-seed empty cells from random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_vectors(sums)
+
+        self.centroids = centroids
+        self.lists = [GrowableMatrix(vectors.shape[1]) for _ in range(self.nlist)]
+        buffered_ids, buffered_vectors = ids.copy(), vectors.copy()
+        self._untrained = GrowableMatrix()
+        self._count -= len(buffered_ids)
+        self.add(buffered_ids, buffered_vectors)
+        logger.info(f"Trained IVF index with {self.nlist} cells on {sample_size} vectors")
+
+    def search(self, query: np.ndarray, k: int,
+               partitions: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if k <= 0 or self._count == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        allowed = None
+        if partitions is not None:
+            allowed = np.fromiter(self._partitions.allowed(partitions), dtype=np.int64)
+
+        cells = [self._untrained] if not self.is_trained else \
+            [self.lists[cell] for cell in top_k(self.centroids @ query, self.nprobe)]
+        candidate_ids, candidate_scores = [], []
+        for cell in cells:
+            ids, matrix = cell.view()
+            if allowed is not None:
+                # Drop other partitions before the matrix product
+                mask = np.isin(ids, allowed)
+                ids, matrix = ids[mask], matrix[mask]
+            if len(ids):
+                candidate_ids.append(ids)
+                candidate_scores.append(matrix @ query)
+
+        return merge_top_k(candidate_ids, candidate_scores, k)
+
+    def assign_partitions(self, ids: List[int], partitions: List[str]):
+        self._partitions.add(ids, partitions)
+
+    def remove(self, ids: List[int]):
+        ids = np.asarray(ids, dtype=np.int64)
+        cells = self.lists if self.is_trained else [self._untrained]
+        self._count -= sum(cell.remove(ids) for cell in cells)
+        self._partitions.remove(ids.tolist())
+
+    def get_ids(self) -> np.ndarray:
+        if not self.is_trained:
+            return self._untrained.view()[0]
+        parts = [cell.view()[0] for cell in self.lists]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def save(self, path: str):
+        if self.is_trained:
+            views = [cell.view() for cell in self.lists]
+            offsets = np.cumsum([0] + [len(ids) for ids, _ in views])
+            ids = np.concatenate([ids for ids, _ in views])
+            vectors = np.concatenate([vectors for _, vectors in views])
+            centroids = self.centroids
+        else:
+            ids, vectors = self._untrained.view()
+            offsets = np.zeros(0, dtype=np.int64)
+            centroids = np.zeros((0, vectors.shape[1] if vectors.ndim == 2 else 0), dtype=np.float32)
+
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=centroids, offsets=offsets, ids=ids, vectors=vectors,
+                 nlist=self.nlist)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            if int(data["nlist"]) != self.nlist:
+                logger.info("IVF index on disk uses a different nlist, rebuilding")
+                return False
+            self.reset()
+            ids, vectors, offsets = data["ids"], data["vectors"], data["offsets"]
+            if len(data["centroids"]) == 0:
+                self._untrained.append(ids, vectors)
+            else:
+                self.centroids = data["centroids"]
+                self.lists = [GrowableMatrix(vectors.shape[1]) for _ in range(self.nlist)]
+                for cell in range(self.nlist):
+                    start, end = offsets[cell], offsets[cell + 1]
+                    if end > start:
+                        self.lists[cell].append(ids[start:end], vectors[start:end])
+            self._count = len(ids)
+        return True
+
+class HNSWIndex(VectorIndex):
+    """Graph index backed by the optional `hnswlib` package
+
+    Removed vectors are only marked deleted in the graph; their ids are kept in a
+    `.deleted.npy` sidecar so they stay hidden after a reload.
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, m: int = 16, ef_construction: int = 200, ef_search: int = 64,
+                 initial_capacity: int = 1024):
+        if hnswlib is None:
+            raise ImportError("hnswlib is not installed")
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.initial_capacity = initial_capacity
+        self.reset()
+
+    def reset(self):
+        self._index = None
+        self._dim = None
+        self._deleted = set()
+        self._partitions = PartitionMap()
+
+    def _ensure_index(self, dim: int, capacity: int):
+        if self._index is None:
+            self._dim = dim
+            self._index = hnswlib.Index(space="ip", dim=dim)
+            self._index.init_index(max_elements=max(capacity, self.initial_capacity),
+                                   ef_construction=self.ef_construction, M=self.m)
+            self._index.set_ef(self.ef_search)
+        elif self._index.get_current_count() + capacity > self._index.get_max_elements():
+            self._index.resize_index(max(2 * self._index.get_max_elements(),
+                                         self._index.get_current_count() + capacity))
+
+    def add(self, ids: List[int], vectors: np.ndarray, rows: Optional[np.ndarray] = None,
+            partitions: Optional[List[str]] = None):
+        vectors = normalize_vectors(vectors)
+        self._ensure_index(vectors.shape[1], len(vectors))
+        # Revive re-added ids first: hnswlib >= 0.7 undeletes them in add_items, after
+        # which unmark_deleted raises
+        for chunk_id in self._deleted.intersection(int(chunk_id) for chunk_id in ids):
+            self._index.unmark_deleted(chunk_id)
+            self._deleted.discard(chunk_id)
+        self._index.add_items(vectors, np.asarray(ids, dtype=np.int64))
+        self._partitions.add(ids, partitions)
+
+    def search(self, query: np.ndarray, k: int,
+               partitions: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if self._index is None or k <= 0 or len(self) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query_kwargs = {}
+        count = len(self)
+        if partitions is not None:
+            # hnswlib checks the filter while traversing, so other partitions are never scored
+            allowed = self._partitions.allowed(partitions) - self._deleted
+            if not allowed:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            query_kwargs["filter"] = allowed.__contains__
+            count = len(allowed)
+
+        k = min(k, count)
+        self._index.set_ef(max(self.ef_search, k))
+        labels, distances = self._index.knn_query(query, k=k, **query_kwargs)
+        # hnswlib reports inner-product distance as 1 - dot
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def search_batch(self, queries: np.ndarray, k: int,
+                     partitions: Optional[Iterable[str]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if partitions is not None or self._index is None or k <= 0 or len(self) == 0:
+            return super().search_batch(queries, k, partitions)
+        # hnswlib answers a query block in one call, across its own threads
+        k = min(k, len(self))
+        self._index.set_ef(max(self.ef_search, k))
+        labels, distances = self._index.knn_query(queries, k=k)
+        return list(zip(labels.astype(np.int64), (1.0 - distances).astype(np.float32)))
+
+    def get_ids(self) -> np.ndarray:
+        if self._index is None:
+            return np.zeros(0, dtype=np.int64)
+        ids = np.asarray(self._index.get_ids_list(), dtype=np.int64)
+        if self._deleted:
+            ids = ids[~np.isin(ids, np.fromiter(self._deleted, dtype=np.int64))]
+        return ids
+
+    def remove(self, ids: List[int]):
+        if self._index is None:
+            return
+        live = set(self._index.get_ids_list()) - self._deleted
+        for chunk_id in {int(chunk_id) for chunk_id in ids} & live:
+            self._index.mark_deleted(chunk_id)
+            self._deleted.add(chunk_id)
+        self._partitions.remove(ids)
+
+    def assign_partitions(self, ids: List[int], partitions: List[str]):
+        self._partitions.add(ids, partitions)
+
+    def __len__(self) -> int:
+        return 0 if self._index is None else self._index.get_current_count() - len(self._deleted)
+
+    def save(self, path: str):
+        if self._index is not None:
+            self._index.save_index(path)
+            with open(path + ".dim", "w") as f:
+                f.write(str(self._dim))
+            np.save(path + ".deleted.npy", np.fromiter(self._deleted, dtype=np.int64))
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path) or not self._load_dim(path):
+            return False
+        self._index = hnswlib.Index(space="ip", dim=self._dim)
+        self._index.load_index(path)
+        self._index.set_ef(self.ef_search)
+        deleted_path = path + ".deleted.npy"
+        self._deleted = set(np.load(deleted_path).tolist()) if os.path.exists(deleted_path) else set()
+        return True
+
+    def _load_dim(self, path: str) -> bool:
+        """Read the vector dimension stored alongside the graph"""
+        dim_path = path + ".dim"
+        if not os.path.exists(dim_path):
+            return False
+        with open(dim_path, "r") as f:
+            self._dim = int(f.read().strip())
+        return True
+
+INDEX_FILE_SUFFIXES = {
+    "ivf": ".ivf.npz",
+    "hnsw": ".hnsw.bin",
+    "quantized": ".quantized.npz"
+}
+
+def create_index(index_config: Optional[Dict[str, Any]] = None, store=None) -> VectorIndex:
+    """Build the index described by the `rag.index` config, falling back to brute force
+
+    With an EmbeddingStore, exact search runs over the shared memory-mapped matrix
+    (and the quantized index re-scores its shortlist from it).
+    """
+    index_config = index_config or {}
+    kind = index_config.get("type", "brute_force")
+
+    try:
+        if kind == "ivf":
+            return IVFIndex(
+                nlist=index_config.get("nlist", 256),
+                nprobe=index_config.get("nprobe", 8)
+            )
+        if kind == "hnsw":
+            return HNSWIndex(
+                m=index_config.get("hnsw_m", 16),
+                ef_construction=index_config.get("hnsw_ef_construction", 200),
+                ef_search=index_config.get("hnsw_ef_search", 64)
+            )
+        if kind == "quantized":
+            from .quantization import QuantizedIndex, create_codec
+            return QuantizedIndex(
+                create_codec(
+                    index_config.get("quantization", "int8"),
+                    pq_m=index_config.get("pq_m", 48),
+                    pq_bits=index_config.get("pq_bits", 8)
+                ),
+                store=store,
+                rescore=index_config.get("rescore", 4)
+            )
+    except (ImportError, ValueError) as e:
+        logger.warning(f"Vector index '{kind}' unavailable ({e}), using exact brute-force search")
+        kind = "brute_force"
+
+    if kind != "brute_force":
+        logger.warning(f"Unknown vector index type '{kind}', using exact brute-force search")
+    return MemmapBruteForceIndex(store) if store is not None else BruteForceIndex()
+
+def index_path_for(db_path: str, index: VectorIndex) -> Optional[str]:
+    """Return where an index persists itself next to the knowledge database"""
+    suffix = INDEX_FILE_SUFFIXES.get(index.kind)
+    if not suffix:
+        return None
+    return os.path.splitext(db_path)[0] + suffix